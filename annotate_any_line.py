@@ -5,6 +5,8 @@
 import os, json, sys
 
 LEVELS = {"notice": "notice", "warning": "warning", "error": "error"}
+# Workflow-command data escaping, applied in one translate() pass per message
+MESSAGE_ESCAPES = str.maketrans({"%": "%25", "\r": "%0D", "\n": "%0A"})
 
 def main():
     target = os.environ.get("TARGET_FILE")
@@ -26,7 +28,7 @@ def main():
     for c in comments:
         line = int(c.get("line", 0))
         level = LEVELS.get(str(c.get("level", "notice")).lower(), "notice")
-        msg = str(c.get("message", "")).replace("\n", r"\n")
+        msg = str(c.get("message", "")).translate(MESSAGE_ESCAPES)
 
         if line <= 0:
             print(f"::warning ::Skipping invalid line '{line}' for {target}")
@@ -1,8 +1,10 @@
-import os, sys, json, re, uuid
+import os, sys, json, re, uuid, hashlib
 from pathlib import Path
-from snowflake.snowpark import Session
-import pandas as pd
 from datetime import datetime
+from itertools import chain, islice
+from functools import lru_cache
+from collections import Counter, deque
+from string import Template
 
 # ---------------------
 # Config
@@ -10,21 +12,65 @@ from datetime import datetime
 MODEL = "openai-gpt-4.1"
 MAX_CHARS_FOR_FINAL_SUMMARY_FILE = 65000
 MAX_TOKENS_FOR_SUMMARY_INPUT = 100000
+MAX_CHARS_FOR_PREVIOUS_SUMMARY = 3000  # previous review summary carried into the consolidation prompt
 FILE_TO_REVIEW = "scripts/simple_test.py"
 
+# JSON outputs are read by tooling (inline_comment.py); pretty-print them only when CORTEX_DEBUG is set
+CORTEX_DEBUG = bool(os.environ.get("CORTEX_DEBUG"))
+
+# On-disk cache of Cortex responses keyed by model + prompt, so re-runs on unchanged code skip the round trip.
+# Caching is off unless CORTEX_CACHE_DIR names a directory: cache keys are computable from public inputs,
+# so a default inside the checkout could be seeded with responses by the code under review
+CORTEX_CACHE_DIR = Path(os.environ["CORTEX_CACHE_DIR"]) if os.environ.get("CORTEX_CACHE_DIR") else None
+CORTEX_CACHE_MAX_ENTRIES = 256  # oldest (by last use) entries are evicted beyond this
+# COMPLETE queries allowed in flight at once; before another is sent the oldest is collected, so a
+# large PR does not queue dozens of concurrent queries on one session and warehouse
+CORTEX_MAX_IN_FLIGHT = 4
+cortex_jobs_in_flight = deque()  # finish() callables of submitted, not yet collected queries
+
+# Severity levels reported in the executive summary
+SEVERITY_LEVELS = ("Critical", "High", "Medium", "Low")
+
+# Content sniffing for files without a recognized extension: one case-insensitive
+# scan per language instead of lower-casing the whole file and probing each keyword
+SQL_KEYWORDS_RE = re.compile(r'select|insert|update|delete|create table|alter table|drop table', re.IGNORECASE)
+PYTHON_KEYWORDS_RE = re.compile(r'def |class |import |from |if __name__', re.IGNORECASE)
+
+# Decoder for recovering JSON embedded in free-form LLM responses; raw_decode() parses in place, no slicing
+JSON_DECODER = json.JSONDecoder()
+
 # ---------------------
 # Snowflake session
 # ---------------------
+# Connection settings come from the SNOWFLAKE_* variables the workflow exports from repository
+# secrets; the password has no default, so it never lives in the source
 cfg = {
-    "account": "XKB93357.us-west-2",
-    "user": "MANISHAT007", 
-    "password": "Welcome@987654321",
-    "role": "ORGADMIN",
-    "warehouse": "COMPUTE_WH",
-    "database": "MY_DB",
-    "schema": "PUBLIC",
+    "account": os.environ.get("SNOWFLAKE_ACCOUNT") or "XKB93357.us-west-2",
+    "user": os.environ.get("SNOWFLAKE_USER") or "MANISHAT007",
+    "password": os.environ.get("SNOWFLAKE_PASSWORD"),
+    "role": os.environ.get("SNOWFLAKE_ROLE") or "ORGADMIN",
+    "warehouse": os.environ.get("SNOWFLAKE_WAREHOUSE") or "COMPUTE_WH",
+    "database": os.environ.get("SNOWFLAKE_DATABASE") or "MY_DB",
+    "schema": os.environ.get("SNOWFLAKE_SCHEMA") or "PUBLIC",
 }
-session = Session.builder.configs(cfg).create()
+session = None
+
+def get_session():
+    """Return the shared Snowpark session, logging in on first use.
+
+    Snowpark is imported here rather than at module load, so runs served
+    entirely from the Cortex response cache (or that exit before any
+    Snowflake work) skip both the import and the login round trip. A
+    driver that already holds an active session in this process (or sets
+    the module's session before calling main) has it reused, not a new login.
+    A session that has since been closed is replaced; the check is local to
+    the connector, so reuse costs no round trip.
+    """
+    global session
+    if session is None or session.connection.is_closed():
+        from snowflake.snowpark import Session
+        session = Session.builder.configs(cfg).getOrCreate()
+    return session
 
 # ---------------------
 # PROMPT TEMPLATES
@@ -164,8 +210,119 @@ CRITICAL INSTRUCTION: You must analyze the new code changes with full awareness
 {consolidated_template}
 """
 
+# Prompts compiled once at import
+def prompt_template(text: str, *fields: str) -> Template:
+    """Compile a prompt with {field} placeholders into a string.Template.
+
+    Every field is then filled in one substitute() pass at call time, instead of one
+    full-prompt replace() copy per placeholder (and substituted values are never re-scanned).
+    """
+    for field in fields:
+        text = text.replace("{" + field + "}", "${" + field + "}")
+    return Template(text)
+
+# Static parts (the shared consolidated body and its character budget) are filled in once here
+CONSOLIDATED_PROMPT_TEXT = PROMPT_TEMPLATE_CONSOLIDATED.replace("{MAX_CHARS_FOR_FINAL_SUMMARY_FILE}", str(MAX_CHARS_FOR_FINAL_SUMMARY_FILE))
+# The reviews are its only field, so like the individual prompt it is split around them once
+CONSOLIDATED_PROMPT_HEAD, CONSOLIDATED_PROMPT_TAIL = CONSOLIDATED_PROMPT_TEXT.split("{ALL_REVIEWS_CONTENT}", 1)
+CONTEXT_PROMPT = prompt_template(
+    PROMPT_TEMPLATE_WITH_CONTEXT.replace("{consolidated_template}", CONSOLIDATED_PROMPT_TEXT),
+    "previous_context", "pr_number", "ALL_REVIEWS_CONTENT",
+)
+# The source goes last, so split the individual prompt around it once, and the head around its
+# two fields (filename, then file extension): a build is then a single join of static segments and
+# the inputs, with the (possibly large) code never scanned or copied twice
+INDIVIDUAL_PROMPT_HEAD, INDIVIDUAL_PROMPT_TAIL = PROMPT_TEMPLATE_INDIVIDUAL.split("{PY_CONTENT}", 1)
+INDIVIDUAL_PROMPT_LEAD, INDIVIDUAL_PROMPT_HEAD = INDIVIDUAL_PROMPT_HEAD.split("{filename}", 1)
+INDIVIDUAL_PROMPT_MID, INDIVIDUAL_PROMPT_HEAD = INDIVIDUAL_PROMPT_HEAD.split("{file_extension}", 1)
+
+# ---------------------
+# REPORT TEMPLATES
+# ---------------------
+# Emoji lookup tables, shared by every report instead of rebuilt per row
+QUALITY_EMOJI_BANDS = ((80, "🟢"), (60, "🟡"), (float("-inf"), "🔴"))
+RISK_EMOJI = {"LOW": "🟢", "MEDIUM": "🟡", "HIGH": "🟠", "CRITICAL": "🔴"}
+STATUS_EMOJI = {"RESOLVED": "✅", "PARTIALLY_RESOLVED": "⚠️", "NOT_ADDRESSED": "❌", "WORSENED": "🔴"}
+PRIORITY_EMOJI = {"Critical": "🔴", "High": "🟠", "Medium": "🟡", "Low": "🟢"}
+# Model text in table cells: a pipe would split the cell (inside code spans too), so it is always
+# escaped; "<" could open raw HTML, but GitHub shows entities inside `code spans` literally, so it is
+# only escaped outside them (see escape_table_cell)
+TABLE_CELL_ESCAPES = str.maketrans({"|": "\\|"})
+CODE_SPAN_RE = re.compile(r"(`+).+?(?<!`)\1(?!`)", re.DOTALL)
+
+# Static markdown for the executive summary, built once at import; only the
+# placeholders are filled per report.
+REPORT_TEMPLATE_HEADER = """# 📊 Executive Code Review Report
+
+**Files Analyzed:** {file_count} files | **Analysis Date:** {analysis_date}
+
+## 🎯 Executive Summary
+{summary}
+
+## 📈 Quality Dashboard
+
+| Metric | Score | Status | Business Impact |
+|--------|-------|--------|-----------------|
+| **Overall Quality** | {quality_score}/100 | {quality_emoji} | {business_impact} Risk |
+| **Security Risk** | {security_risk} | {security_emoji} | Critical security concerns |
+| **Technical Debt** | {tech_debt} | {tech_debt_emoji} | {findings_count} items |
+| **Maintainability** | {maintainability} | {maintainability_emoji} | Long-term sustainability |
+
+## 🔍 Issue Distribution
+
+| Severity | Count | Priority Actions |
+|----------|-------|------------------|
+| 🔴 Critical | {critical_count} | Immediate fix required |
+| 🟠 High | {high_count} | Fix within sprint |
+| 🟡 Medium | {medium_count} | Plan for next release |
+| 🟢 Low | {low_count} | Technical debt |
+
+## 📁 File Analysis Breakdown
+
+| File Type | Count | Critical Issues | High Issues |
+|-----------|-------|----------------|-------------|
+| 🐍 Python | {python_file_count} | {python_critical} | {python_high} |
+| 🗄️ SQL | {sql_file_count} | {sql_critical} | {sql_high} |
+| 📄 Other | {other_file_count} | 0 | 0 |
+
+## 🚨 Critical Issues Summary
+
+⚠️ **IMMEDIATE ACTION REQUIRED** - The following critical issues must be addressed before deployment:
+"""
+
+REPORT_SECTION_PREVIOUS_ISSUES = """\n<details>
+<summary><strong>📈 Previous Issues Resolution Status</strong> (Click to expand)</summary>
+
+| Previous Issue | Status | Details |
+|----------------|--------|---------|
+"""
+
+REPORT_SECTION_FINDINGS = """\n<details>
+<summary><strong>🔍 Current Review Findings</strong> (Click to expand)</summary>
+
+| Priority | File | Line | Issue | Business Impact |
+|----------|------|------|-------|-----------------|
+"""
+
+REPORT_SECTION_RECOMMENDATIONS = """\n<details>
+<summary><strong>🎯 Strategic Recommendations</strong> (Click to expand)</summary>
+
+"""
+
+REPORT_SECTION_ACTIONS = """\n<details>
+<summary><strong>⚡ Immediate Actions Required</strong> (Click to expand)</summary>
+
+"""
+
+REPORT_TEMPLATE_FOOTER = """\n---
+
+**📋 Review Summary:** {findings_count} findings identified | **🎯 Quality Score:** {quality_score}/100 | **⚡ Critical Issues:** {critical_count}
+
+*🔬 Powered by Snowflake Cortex AI • Two-Stage Executive Analysis*"""
+
+@lru_cache(maxsize=None)
 def get_file_extension(filename: str) -> str:
-    """Get file extension for better context in prompts."""
+    """Get file extension for better context in prompts (cached: called per chunk and per report)."""
     ext = Path(filename).suffix.lower()
     if ext == '.py':
         return 'Python'
@@ -179,36 +336,105 @@ def get_file_extension(filename: str) -> str:
         return 'Unknown'
 
 def build_prompt_for_individual_review(code_text: str, filename: str = "code_file") -> str:
-    file_ext = get_file_extension(filename)
-    prompt = PROMPT_TEMPLATE_INDIVIDUAL.replace("{PY_CONTENT}", code_text)
-    prompt = prompt.replace("{filename}", filename)
-    prompt = prompt.replace("{file_extension}", file_ext)
-    return prompt
+    return "".join((INDIVIDUAL_PROMPT_LEAD, filename, INDIVIDUAL_PROMPT_MID, get_file_extension(filename), INDIVIDUAL_PROMPT_HEAD, code_text, INDIVIDUAL_PROMPT_TAIL))
 
 def build_prompt_for_consolidated_summary(all_reviews_content: str, previous_context: str = None, pr_number: int = None) -> str:
     if previous_context and pr_number:
-        prompt = PROMPT_TEMPLATE_WITH_CONTEXT.replace("{previous_context}", previous_context)
-        prompt = prompt.replace("{pr_number}", str(pr_number))
-        prompt = prompt.replace("{consolidated_template}", PROMPT_TEMPLATE_CONSOLIDATED)
-        prompt = prompt.replace("{ALL_REVIEWS_CONTENT}", all_reviews_content)
-    else:
-        prompt = PROMPT_TEMPLATE_CONSOLIDATED.replace("{ALL_REVIEWS_CONTENT}", all_reviews_content)
-    return prompt
-
-def review_with_cortex(model, prompt_text: str, session) -> str:
+        return CONTEXT_PROMPT.substitute(previous_context=previous_context, pr_number=pr_number, ALL_REVIEWS_CONTENT=all_reviews_content)
+    return "".join((CONSOLIDATED_PROMPT_HEAD, all_reviews_content, CONSOLIDATED_PROMPT_TAIL))
+
+@lru_cache(maxsize=8)
+def cortex_cache_seed(model):
+    """BLAKE2b state already fed the model, hashed once per model."""
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(str(model).encode('utf-8'))
+    digest.update(b"\0")
+    return digest
+
+def cortex_cache_path(model, prompt_text: str) -> Path:
+    """Cache file for a model/prompt pair, named by a short BLAKE2b digest of both.
+
+    Only the prompt is hashed here; the model comes from a copy of the seed.
+    """
+    digest = cortex_cache_seed(model).copy()
+    digest.update(prompt_text.encode('utf-8'))
+    return CORTEX_CACHE_DIR / f"{digest.hexdigest()}.txt"
+
+def store_cortex_response(cache_path: Path, response: str) -> None:
+    """Atomically write a response to the cache and evict least recently used entries."""
     try:
-        # Better escaping for SQL injection prevention
-        clean_prompt = prompt_text.replace("'", "''").replace("\\", "\\\\")
-        
-        # Use parameterized query instead
-        query = "SELECT SNOWFLAKE.CORTEX.COMPLETE(?, ?) as response"
-        df = session.sql(query, params=[model, clean_prompt])
-        result = df.collect()[0][0]
-        return result
-    except Exception as e:
+        CORTEX_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_bytes(response.encode('utf-8'))
+        os.replace(tmp_path, cache_path)
+        entries = sorted(CORTEX_CACHE_DIR.glob("*.txt"), key=lambda p: p.stat().st_mtime)
+        for stale in entries[:-CORTEX_CACHE_MAX_ENTRIES]:
+            stale.unlink(missing_ok=True)
+    except OSError as e:
+        print(f"Warning: could not cache Cortex response: {e}", file=sys.stderr)
+
+def discard_cortex_response(model, prompt_text: str) -> None:
+    """Drop a cached response the caller could not use, so the next run asks Cortex again."""
+    if CORTEX_CACHE_DIR is None:
+        return
+    try:
+        cortex_cache_path(model, prompt_text).unlink(missing_ok=True)
+    except OSError as e:
+        print(f"Warning: could not drop cached Cortex response: {e}", file=sys.stderr)
+
+def start_cortex_review(model, prompt_text: str, session=None):
+    """Submit a Cortex completion without waiting for it; returns a callable that yields the text.
+
+    Cache hits (when CORTEX_CACHE_DIR is set) resolve immediately. Misses are sent with collect_nowait(), so the caller can
+    prepare and submit further prompts while Cortex generates, and collect the results later.
+    At most CORTEX_MAX_IN_FLIGHT misses are outstanding: past that, the oldest is collected
+    first. The returned callable keeps its result, so calling it again is free.
+    """
+    cache_path = cortex_cache_path(model, prompt_text) if CORTEX_CACHE_DIR is not None else None
+    if cache_path is not None:
+        try:
+            cached = cache_path.read_bytes().decode('utf-8')
+            os.utime(cache_path)  # mark as recently used for eviction
+            return lambda: cached
+        except (OSError, UnicodeDecodeError):
+            pass
+
+    def failed(e) -> str:
         print(f"Error calling Cortex complete for model '{model}': {e}", file=sys.stderr)
         return f"ERROR: Could not get response from Cortex. Reason: {e}"
 
+    while len(cortex_jobs_in_flight) >= CORTEX_MAX_IN_FLIGHT:
+        cortex_jobs_in_flight[0]()  # collecting a query takes it out of the window
+
+    try:
+        session = session or get_session()  # cache misses are the first point Cortex needs a login
+        # Bind model and prompt as parameters so the prompt is sent verbatim, without escaping copies
+        df = session.sql("SELECT SNOWFLAKE.CORTEX.COMPLETE(?, ?) as response", params=[model, prompt_text])
+        job = df.limit(1).collect_nowait()  # single scalar row; the query runs while the caller carries on
+    except Exception as e:
+        error_text = failed(e)
+        return lambda: error_text
+
+    collected = []
+
+    def finish() -> str:
+        if not collected:
+            cortex_jobs_in_flight.remove(finish)
+            try:
+                result = job.result()[0][0]
+                if result and cache_path is not None:
+                    store_cortex_response(cache_path, result)
+            except Exception as e:
+                result = failed(e)
+            collected.append(result)
+        return collected[0]
+
+    cortex_jobs_in_flight.append(finish)
+    return finish
+
+def review_with_cortex(model, prompt_text: str, session=None) -> str:
+    return start_cortex_review(model, prompt_text, session)()
+
 def chunk_large_file(code_text: str, max_chunk_size: int = 50000) -> list:
     if len(code_text) <= max_chunk_size:
         return [code_text]
@@ -233,10 +459,78 @@ def chunk_large_file(code_text: str, max_chunk_size: int = 50000) -> list:
     
     return chunks
 
+def fit_reviews_to_token_budget(reviews: list, prompt_without_reviews: str, max_tokens: int = MAX_TOKENS_FOR_SUMMARY_INPUT) -> str:
+    """Serialize the reviews for the consolidation prompt, trimming feedback so the prompt fits max_tokens.
+
+    The budget covers the whole prompt: the template (and any previous-review context) passed in
+    as prompt_without_reviews, plus the reviews exactly as serialized, JSON keys and escaping
+    included. A token spans at least one UTF-8 byte, so a prompt whose byte length already fits
+    skips the tokenizer, and bytes stand in for tokens when tiktoken is not installed. Otherwise
+    the feedback budget is shared out so short reviews are kept whole and only the longest ones
+    are cut, on a token boundary, and the serialized result is re-counted until it fits.
+    """
+    combined = json.dumps(reviews, indent=2)
+    if len(prompt_without_reviews.encode('utf-8')) + len(combined.encode('utf-8')) <= max_tokens:
+        return combined
+
+    try:
+        import tiktoken
+        tokenizer = tiktoken.get_encoding("cl100k_base")
+        def encode(text: str):
+            return tokenizer.encode(text, disallowed_special=())
+        decode = tokenizer.decode
+    except ImportError:
+        # Without tiktoken, budget UTF-8 bytes instead: never fewer than the tokens, so the prompt
+        # is trimmed a little more than needed but still fits, and the summary is not lost
+        print("  ⚠️ tiktoken not installed; budgeting the consolidation prompt by bytes", file=sys.stderr)
+        def encode(text: str):
+            return text.encode('utf-8')
+        def decode(data: bytes) -> str:
+            return data.decode('utf-8', errors='ignore')  # a cut can split a multi-byte character
+    def count_tokens(text: str) -> int:
+        return len(encode(text))
+
+    reviews_budget = max_tokens - count_tokens(prompt_without_reviews)
+    excess = count_tokens(combined) - reviews_budget
+    if excess <= 0:
+        return combined
+
+    token_ids = [encode(r["review_feedback"]) for r in reviews]
+    kept_tokens = {i: len(ids) for i, ids in enumerate(token_ids)}
+    feedback_budget = sum(kept_tokens.values())
+    order = sorted(kept_tokens, key=kept_tokens.get)
+    # Tokens the serialized reviews cost with no feedback at all (keys, filenames, indentation)
+    serialized_overhead = count_tokens(json.dumps([{**r, "review_feedback": ""} for r in reviews], indent=2))
+    # Escaping makes serialized feedback longer than its raw tokens, so scale the raw budget by the
+    # share of the serialized feedback that fits (always dropping at least one token), and re-count
+    # until the serialized reviews fit or nothing is left to cut
+    while excess > 0 and feedback_budget > 0:
+        serialized_feedback = reviews_budget + excess - serialized_overhead
+        scaled_budget = feedback_budget * max(0, reviews_budget - serialized_overhead) // max(1, serialized_feedback)
+        feedback_budget = max(0, min(feedback_budget - 1, scaled_budget))
+        # Hand each review an equal share of what is left, shortest first, so unused shares carry over
+        remaining = feedback_budget
+        for position, i in enumerate(order):
+            kept_tokens[i] = min(len(token_ids[i]), remaining // (len(order) - position))
+            remaining -= kept_tokens[i]
+        fitted = [
+            {**review, "review_feedback": decode(token_ids[i][:kept_tokens[i]]) + "\n... [truncated]"}
+            if kept_tokens[i] < len(token_ids[i]) else review
+            for i, review in enumerate(reviews)
+        ]
+        combined = json.dumps(fitted, indent=2)
+        excess = count_tokens(combined) - reviews_budget
+
+    for i, review in enumerate(reviews):
+        if kept_tokens[i] < len(token_ids[i]):
+            print(f"  ⚠️ Review for {review['filename']} truncated from {len(token_ids[i])} to {kept_tokens[i]} tokens")
+    if excess > 0:
+        print(f"  ⚠️ Consolidation prompt still exceeds {max_tokens} tokens after trimming every review")
+    return combined
+
 def categorize_file_by_content(code_content: str, filename: str) -> str:
     """Better file categorization based on content and extension."""
     filename_lower = filename.lower()
-    content_lower = code_content.lower()
     
     # Check file extensions first
     if filename_lower.endswith('.sql'):
@@ -249,18 +543,110 @@ def categorize_file_by_content(code_content: str, filename: str) -> str:
         return 'TypeScript'
     
     # Check content for SQL keywords
-    sql_keywords = ['select', 'insert', 'update', 'delete', 'create table', 'alter table', 'drop table']
-    if any(keyword in content_lower for keyword in sql_keywords):
+    if SQL_KEYWORDS_RE.search(code_content):
         return 'SQL'
     
     # Check content for Python keywords
-    python_keywords = ['def ', 'class ', 'import ', 'from ', 'if __name__']
-    if any(keyword in content_lower for keyword in python_keywords):
+    if PYTHON_KEYWORDS_RE.search(code_content):
         return 'Python'
     
     return 'Unknown'
 
-def format_executive_pr_display(json_response: dict, processed_files: list) -> str:
+def read_text_file(path) -> str:
+    """Read a whole UTF-8 file as bytes and decode once, skipping the text-mode IO layer.
+
+    Binary readall() sizes its buffer from fstat, so the file arrives in a single raw read.
+    Line endings are then translated as text mode would (universal newlines), so CRLF files
+    reach the prompts without a carriage return on every line; without any CR the
+    replace() calls return the string itself.
+    """
+    with open(path, 'rb') as f:
+        return f.read().decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+
+def write_text_file(path, text: str) -> None:
+    """Write text as UTF-8 bytes, skipping the text-mode IO wrapper.
+
+    The text is encoded in 64 KiB slices written straight to the file, so a large
+    report never sits in memory twice (the string plus a full bytes copy).
+    """
+    with open(path, 'wb') as f:
+        for start in range(0, len(text), 1 << 16):
+            f.write(text[start:start + (1 << 16)].encode('utf-8'))
+
+def write_json_file(path, data) -> None:
+    """Write data to path as UTF-8 JSON, compact unless CORTEX_DEBUG is set.
+
+    The document is built with a single encode() call, which (for compact output) runs
+    the C encoder; iterencode() always falls back to the pure-Python one. Bytes still go
+    out in slices through write_text_file, so no full bytes copy is held.
+    """
+    if CORTEX_DEBUG:
+        encoder = json.JSONEncoder(indent=2, ensure_ascii=False)
+    else:
+        encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False)
+    write_text_file(path, encoder.encode(data))
+
+def normalize_finding_severities(findings: list) -> list:
+    """Canonicalize each finding's severity to Critical/High/Medium/Low casing, in place.
+
+    Run once on the Cortex output so downstream counting and filtering can compare
+    severities directly instead of re-normalizing them per use. Severities that are
+    missing or not one of the four levels are left as reported, so they stay unranked
+    (shown in the findings table, skipped by the scorer) rather than passing as Low.
+    """
+    for f in findings:
+        severity = str(f.get("severity") or "").strip().capitalize()
+        if severity in SEVERITY_LEVELS:
+            f["severity"] = severity
+    return findings
+
+def score_band(score, bands=QUALITY_EMOJI_BANDS) -> str:
+    """Return the label of the first (threshold, label) band the score reaches."""
+    return next(label for threshold, label in bands if score >= threshold)
+
+def truncate_text(text: str, limit: int) -> str:
+    """Cut text to limit characters, marking a cut with "..."; the length is checked once."""
+    return text if len(text) <= limit else text[:limit] + "..."
+
+def escape_table_cell(text: str) -> str:
+    """Escape model text for a markdown table cell without touching what it quotes in backticks.
+
+    Pipes are escaped everywhere; "<" becomes &lt; only outside code spans, where GitHub would
+    otherwise show the entity itself.
+    """
+    if "<" in text:
+        parts = []
+        pos = 0
+        for span in CODE_SPAN_RE.finditer(text):
+            parts.append(text[pos:span.start()].replace("<", "&lt;"))
+            parts.append(span.group())
+            pos = span.end()
+        parts.append(text[pos:].replace("<", "&lt;"))
+        text = "".join(parts)
+    return text.translate(TABLE_CELL_ESCAPES)
+
+@lru_cache(maxsize=16)
+def severity_label(severity: str) -> str:
+    """Emoji-prefixed, escaped severity cell text; memoized since only a handful of severities exist."""
+    return f"{PRIORITY_EMOJI.get(severity, '🟡')} {escape_table_cell(severity)}"
+
+@lru_cache(maxsize=16)
+def status_label(status: str) -> str:
+    """Emoji-prefixed resolution status cell text, memoized like severity_label."""
+    return f"{STATUS_EMOJI.get(status, '❓')} {status}"
+
+def partition_findings_by_severity(findings: list) -> tuple:
+    """Split findings into per-severity buckets plus unrecognized ones, in one pass.
+
+    Returns (buckets, unranked_findings); each list keeps the findings' original order.
+    """
+    buckets = {level: [] for level in SEVERITY_LEVELS}
+    unranked_findings = []
+    for f in findings:
+        buckets.get(str(f.get("severity")), unranked_findings).append(f)  # str(): unranked values may be anything
+    return buckets, unranked_findings
+
+def format_executive_pr_display(json_response: dict, processed_files: list, generated_at: datetime = None, partitioned_findings: tuple = None) -> str:
     summary = json_response.get("executive_summary", "Technical analysis completed")
     findings = json_response.get("detailed_findings", [])
     quality_score = json_response.get("quality_score", 75)
@@ -268,152 +654,125 @@ def format_executive_pr_display(json_response: dict, processed_files: list) -> s
     security_risk = json_response.get("security_risk_level", "MEDIUM")
     tech_debt = json_response.get("technical_debt_score", "MEDIUM")
     maintainability = json_response.get("maintainability_rating", "FAIR")
-    metrics = json_response.get("metrics", {})
     strategic_recs = json_response.get("strategic_recommendations", [])
     immediate_actions = json_response.get("immediate_actions", [])
     previous_issues = json_response.get("previous_issues_resolved", [])
     
-    # Count by severity with case-insensitive comparison
-    critical_count = sum(1 for f in findings if str(f.get("severity", "")).lower() == "critical")
-    high_count = sum(1 for f in findings if str(f.get("severity", "")).lower() == "high")
-    medium_count = sum(1 for f in findings if str(f.get("severity", "")).lower() == "medium")
-    low_count = sum(1 for f in findings if str(f.get("severity", "")).lower() == "low")
+    # Count by file type (Counter tallies in C; anything but Python and SQL counts as Other)
+    file_type_counts = Counter(get_file_extension(filename) for filename in processed_files)
+    file_type_counts['Other'] = len(processed_files) - file_type_counts['Python'] - file_type_counts['SQL']
     
-    # Count by file type
-    file_type_counts = {}
-    for filename in processed_files:
-        ext = Path(filename).suffix.lower()
-        if ext == '.py':
-            file_type_counts['Python'] = file_type_counts.get('Python', 0) + 1
-        elif ext == '.sql':
-            file_type_counts['SQL'] = file_type_counts.get('SQL', 0) + 1
-        else:
-            file_type_counts['Other'] = file_type_counts.get('Other', 0) + 1
+    # Partition in a single pass; the buckets feed the severity counts, the per-file-type
+    # counts, the critical issues list and the severity-ordered findings table
+    # (callers that already partitioned the findings pass the result in to avoid another walk)
+    buckets, unranked_findings = partitioned_findings or partition_findings_by_severity(findings)
     
-    # Count critical/high issues by file type
-    python_critical = sum(1 for f in findings if f.get("filename", "").endswith('.py') and str(f.get("severity", "")).lower() == "critical")
-    python_high = sum(1 for f in findings if f.get("filename", "").endswith('.py') and str(f.get("severity", "")).lower() == "high")
-    sql_critical = sum(1 for f in findings if f.get("filename", "").endswith('.sql') and str(f.get("severity", "")).lower() == "critical")
-    sql_high = sum(1 for f in findings if f.get("filename", "").endswith('.sql') and str(f.get("severity", "")).lower() == "high")
+    critical_count = len(buckets["Critical"])
+    high_count = len(buckets["High"])
+    medium_count = len(buckets["Medium"])
+    low_count = len(buckets["Low"])
     
-    risk_emoji = {"LOW": "🟢", "MEDIUM": "🟡", "HIGH": "🟠", "CRITICAL": "🔴"}
-    quality_emoji = "🟢" if quality_score >= 80 else ("🟡" if quality_score >= 60 else "🔴")
+    # Count critical/high issues by file type, tallied in one pass over those two buckets
+    extension_counts = Counter(
+        (level, os.path.splitext(f.get("filename", ""))[1])
+        for level in ("Critical", "High") for f in buckets[level]
+    )
+    python_critical = extension_counts["Critical", ".py"]
+    python_high = extension_counts["High", ".py"]
+    sql_critical = extension_counts["Critical", ".sql"]
+    sql_high = extension_counts["High", ".sql"]
     
-    display_text = f"""# 📊 Executive Code Review Report
-
-**Files Analyzed:** {len(processed_files)} files | **Analysis Date:** {datetime.now().strftime('%Y-%m-%d')}
-
-## 🎯 Executive Summary
-{summary}
-
-## 📈 Quality Dashboard
-
-| Metric | Score | Status | Business Impact |
-|--------|-------|--------|-----------------|
-| **Overall Quality** | {quality_score}/100 | {quality_emoji} | {business_impact} Risk |
-| **Security Risk** | {security_risk} | {risk_emoji.get(security_risk, "🟡")} | Critical security concerns |
-| **Technical Debt** | {tech_debt} | {risk_emoji.get(tech_debt, "🟡")} | {len(findings)} items |
-| **Maintainability** | {maintainability} | {risk_emoji.get(maintainability, "🟡")} | Long-term sustainability |
-
-## 🔍 Issue Distribution
-
-| Severity | Count | Priority Actions |
-|----------|-------|------------------|
-| 🔴 Critical | {critical_count} | Immediate fix required |
-| 🟠 High | {high_count} | Fix within sprint |
-| 🟡 Medium | {medium_count} | Plan for next release |
-| 🟢 Low | {low_count} | Technical debt |
-
-## 📁 File Analysis Breakdown
-
-| File Type | Count | Critical Issues | High Issues |
-|-----------|-------|----------------|-------------|
-| 🐍 Python | {file_type_counts.get('Python', 0)} | {python_critical} | {python_high} |
-| 🗄️ SQL | {file_type_counts.get('SQL', 0)} | {sql_critical} | {sql_high} |
-| 📄 Other | {file_type_counts.get('Other', 0)} | 0 | 0 |
-
-## 🚨 Critical Issues Summary
-
-⚠️ **IMMEDIATE ACTION REQUIRED** - The following critical issues must be addressed before deployment:
-"""
+    # Resolve the report clock once; main() passes the run timestamp so every artifact agrees
+    analysis_date = (generated_at or datetime.now()).date().isoformat()  # same YYYY-MM-DD as strftime, without the format walk
+    
+    quality_emoji = score_band(quality_score)
+    
+    report_parts = [REPORT_TEMPLATE_HEADER.format(
+        file_count=len(processed_files),
+        analysis_date=analysis_date,
+        summary=summary,
+        quality_score=quality_score,
+        quality_emoji=quality_emoji,
+        business_impact=business_impact,
+        security_risk=security_risk,
+        security_emoji=RISK_EMOJI.get(security_risk, "🟡"),
+        tech_debt=tech_debt,
+        tech_debt_emoji=RISK_EMOJI.get(tech_debt, "🟡"),
+        findings_count=len(findings),
+        maintainability=maintainability,
+        maintainability_emoji=RISK_EMOJI.get(maintainability, "🟡"),
+        critical_count=critical_count,
+        high_count=high_count,
+        medium_count=medium_count,
+        low_count=low_count,
+        python_file_count=file_type_counts.get('Python', 0),
+        python_critical=python_critical,
+        python_high=python_high,
+        sql_file_count=file_type_counts.get('SQL', 0),
+        sql_critical=sql_critical,
+        sql_high=sql_high,
+        other_file_count=file_type_counts.get('Other', 0),
+    )]
 
     # Add critical issues summary
-    critical_issues = [f for f in findings if str(f.get("severity", "")).lower() == "critical"]
+    critical_issues = buckets["Critical"]
     if critical_issues:
         for i, issue in enumerate(critical_issues, 1):
             filename = issue.get("filename", "N/A")
             line = issue.get("line_number", "N/A")
-            finding = issue.get("finding", "")[:150] + ("..." if len(issue.get("finding", "")) > 150 else "")
-            display_text += f"\n{i}. **{filename}** (Line {line}): {finding}\n"
+            finding = truncate_text(issue.get("finding", ""), 150)
+            report_parts.append(f"\n{i}. **{filename}** (Line {line}): {finding}\n")
     else:
-        display_text += "\n✅ No critical issues found.\n"
+        report_parts.append("\n✅ No critical issues found.\n")
 
     # Add previous issues resolution status
     if previous_issues:
-        display_text += """\n<details>
-<summary><strong>📈 Previous Issues Resolution Status</strong> (Click to expand)</summary>
-
-| Previous Issue | Status | Details |
-|----------------|--------|---------|
-"""
+        report_parts.append(REPORT_SECTION_PREVIOUS_ISSUES)
         for issue in previous_issues:
             status = issue.get("status", "UNKNOWN")
-            status_emoji = {"RESOLVED": "✅", "PARTIALLY_RESOLVED": "⚠️", "NOT_ADDRESSED": "❌", "WORSENED": "🔴"}.get(status, "❓")
             original = issue.get("original_issue", "")[:80]
             details = issue.get("details", "")[:100]
-            display_text += f"| {original}... | {status_emoji} {status} | {details}... |\n"
+            report_parts.append(f"| {escape_table_cell(original)}... | {status_label(status)} | {escape_table_cell(details)}... |\n")
         
-        display_text += "\n</details>\n"
+        report_parts.append("\n</details>\n")
 
     if findings:
-        display_text += """\n<details>
-<summary><strong>🔍 Current Review Findings</strong> (Click to expand)</summary>
-
-| Priority | File | Line | Issue | Business Impact |
-|----------|------|------|-------|-----------------|
-"""
+        report_parts.append(REPORT_SECTION_FINDINGS)
         
-        severity_order = {"critical": 1, "high": 2, "medium": 3, "low": 4}
-        sorted_findings = sorted(findings, key=lambda x: severity_order.get(str(x.get("severity", "low")).lower(), 4))
+        # Walk the buckets in severity order instead of concatenating a copy of every finding
+        sorted_findings = chain(buckets["Critical"], buckets["High"], buckets["Medium"], buckets["Low"], unranked_findings)
         
-        for finding in sorted_findings[:20]:  # Show top 20 findings
+        for finding in islice(sorted_findings, 20):  # Show top 20 findings
             severity = str(finding.get("severity", "Medium"))
-            filename = finding.get("filename", "N/A")
-            line = finding.get("line_number", "N/A")
-            issue = str(finding.get("finding", ""))[:100] + ("..." if len(str(finding.get("finding", ""))) > 100 else "")
-            business_impact_text = str(finding.get("business_impact", ""))[:80] + ("..." if len(str(finding.get("business_impact", ""))) > 80 else "")
+            # Every cell holds model output, so all of them are escaped, not just the free text
+            filename = escape_table_cell(str(finding.get("filename", "N/A")))
+            line = escape_table_cell(str(finding.get("line_number", "N/A")))
+            issue = truncate_text(str(finding.get("finding", "")), 100)
+            business_impact_text = truncate_text(str(finding.get("business_impact", "")), 80)
             
-            priority_emoji = {"Critical": "🔴", "High": "🟠", "Medium": "🟡", "Low": "🟢"}.get(severity, "🟡")
-            
-            display_text += f"| {priority_emoji} {severity} | {filename} | {line} | {issue} | {business_impact_text} |\n"
+            report_parts.append(f"| {severity_label(severity)} | {filename} | {line} | {escape_table_cell(issue)} | {escape_table_cell(business_impact_text)} |\n")
         
-        display_text += "\n</details>\n"
+        report_parts.append("\n</details>\n")
 
     if strategic_recs:
-        display_text += """\n<details>
-<summary><strong>🎯 Strategic Recommendations</strong> (Click to expand)</summary>
-
-"""
+        report_parts.append(REPORT_SECTION_RECOMMENDATIONS)
         for i, rec in enumerate(strategic_recs, 1):
-            display_text += f"{i}. {rec}\n"
-        display_text += "\n</details>\n"
+            report_parts.append(f"{i}. {rec}\n")
+        report_parts.append("\n</details>\n")
 
     if immediate_actions:
-        display_text += """\n<details>
-<summary><strong>⚡ Immediate Actions Required</strong> (Click to expand)</summary>
-
-"""
+        report_parts.append(REPORT_SECTION_ACTIONS)
         for i, action in enumerate(immediate_actions, 1):
-            display_text += f"{i}. {action}\n"
-        display_text += "\n</details>\n"
-
-    display_text += f"""\n---
+            report_parts.append(f"{i}. {action}\n")
+        report_parts.append("\n</details>\n")
 
-**📋 Review Summary:** {len(findings)} findings identified | **🎯 Quality Score:** {quality_score}/100 | **⚡ Critical Issues:** {critical_count}
+    report_parts.append(REPORT_TEMPLATE_FOOTER.format(
+        findings_count=len(findings),
+        quality_score=quality_score,
+        critical_count=critical_count,
+    ))
 
-*🔬 Powered by Snowflake Cortex AI • Two-Stage Executive Analysis*"""
-
-    return display_text
+    return "".join(report_parts)
 
 def main():
     if len(sys.argv) >= 5:
@@ -458,9 +817,11 @@ def main():
 
     print(f"📁 Found {len(files_to_process)} files to analyze")
     for f in files_to_process:
-        ext = Path(f).suffix.lower()
         print(f"  - {f} ({get_file_extension(f)})")
 
+    # Submit every file's Cortex reviews without waiting: the queries run concurrently while later
+    # files are read and prompted, and are collected in file order afterwards
+    pending_reviews = []
     for filename in files_to_process:
         if directory_mode:
             file_path = os.path.join(folder_path, filename)
@@ -472,11 +833,10 @@ def main():
         processed_files.append(filename)
 
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                code_content = f.read()
+            code_content = read_text_file(file_path)
 
-            if not code_content.strip():
-                review_text = "No code found in file, skipping review."
+            if not code_content or code_content.isspace():  # no stripped copy of the file
+                chunk_jobs = [lambda: "No code found in file, skipping review."]
             else:
                 # Detect file type
                 file_type = categorize_file_by_content(code_content, filename)
@@ -485,22 +845,34 @@ def main():
                 chunks = chunk_large_file(code_content)
                 print(f"  File split into {len(chunks)} chunk(s)")
                 
-                chunk_reviews = []
+                chunk_jobs = []
                 for i, chunk in enumerate(chunks):
                     chunk_name = f"{filename}_chunk_{i+1}" if len(chunks) > 1 else filename
                     print(f"  Processing chunk: {chunk_name}")
                     
                     individual_prompt = build_prompt_for_individual_review(chunk, chunk_name)
-                    review_text = review_with_cortex(MODEL, individual_prompt, session)
-                    chunk_reviews.append(review_text)
-                    
-                    # Debug: Print first 200 chars of review
-                    print(f"    Review preview: {review_text[:200]}...")
+                    chunk_jobs.append(start_cortex_review(MODEL, individual_prompt))
+            pending_reviews.append((filename, chunk_jobs))
+        except Exception as e:
+            pending_reviews.append((filename, e))  # reported in order with the collected reviews
+
+    for filename, chunk_jobs in pending_reviews:
+        try:
+            if isinstance(chunk_jobs, Exception):
+                raise chunk_jobs
+
+            chunk_reviews = []
+            for finish in chunk_jobs:
+                review_text = finish()
+                chunk_reviews.append(review_text)
                 
-                if len(chunk_reviews) > 1:
-                    review_text = "\n\n".join([f"## Chunk {i+1}\n{review}" for i, review in enumerate(chunk_reviews)])
-                else:
-                    review_text = chunk_reviews[0]
+                # Debug: Print first 200 chars of review
+                print(f"    Review preview: {review_text[:200]}...")
+            
+            if len(chunk_reviews) > 1:
+                review_text = "\n\n".join([f"## Chunk {i+1}\n{review}" for i, review in enumerate(chunk_reviews)])
+            else:
+                review_text = chunk_reviews[0]
 
             all_individual_reviews.append({
                 "filename": filename,
@@ -510,8 +882,7 @@ def main():
 
             output_filename = f"{Path(filename).stem}_individual_review.md"
             output_file_path = os.path.join(output_folder_path, output_filename)
-            with open(output_file_path, 'w', encoding='utf-8') as outfile:
-                outfile.write(review_text)
+            write_text_file(output_file_path, review_text)
             print(f"  ✅ Individual review saved: {output_filename}")
 
         except Exception as e:
@@ -547,18 +918,21 @@ def main():
                     REVIEW_TIMESTAMP TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
                 );
                 """
-                session.sql(create_table_query).collect()
+                get_session().sql(create_table_query).collect()
                 
-                query = f"""
+                query = """
                     SELECT REVIEW_SUMMARY, DETAILED_FINDINGS FROM CODE_REVIEW_LOG 
-                    WHERE PULL_REQUEST_NUMBER = {pull_request_number}
+                    WHERE PULL_REQUEST_NUMBER = ?
                     ORDER BY REVIEW_TIMESTAMP DESC 
                     LIMIT 1
                 """
-                result = session.sql(query).collect()
+                result = get_session().sql(query, params=[pull_request_number]).collect()
                 
                 if result:
-                    previous_review_context = result[0]["REVIEW_SUMMARY"][:3000]  # Truncate for prompt
+                    previous_review_context = result[0]["REVIEW_SUMMARY"]
+                    if len(previous_review_context) > MAX_CHARS_FOR_PREVIOUS_SUMMARY:
+                        print(f"  ⚠️ Previous review summary truncated from {len(previous_review_context)} to {MAX_CHARS_FOR_PREVIOUS_SUMMARY} characters")
+                        previous_review_context = previous_review_context[:MAX_CHARS_FOR_PREVIOUS_SUMMARY]
                     print("  📋 Retrieved previous review context - this is a subsequent commit review")
                 else:
                     print("  📋 No previous review found - this is the initial commit review")
@@ -566,7 +940,11 @@ def main():
             except Exception as e:
                 print(f"  Warning: Could not retrieve previous review: {e}")
 
-        combined_reviews_json = json.dumps(all_individual_reviews, indent=2)
+        # Trim the reviews against what the rest of the consolidation prompt leaves of the token budget
+        combined_reviews_json = fit_reviews_to_token_budget(
+            all_individual_reviews,
+            build_prompt_for_consolidated_summary("", previous_review_context, pull_request_number)
+        )
         print(f"  Combined reviews: {len(combined_reviews_json)} characters")
 
         # Generate consolidation prompt with or without previous context
@@ -575,10 +953,9 @@ def main():
             previous_review_context, 
             pull_request_number
         )
-        consolidation_prompt = consolidation_prompt.replace("{MAX_CHARS_FOR_FINAL_SUMMARY_FILE}", str(MAX_CHARS_FOR_FINAL_SUMMARY_FILE))
         
         print("  🤖 Calling Cortex for consolidation...")
-        consolidated_raw = review_with_cortex(MODEL, consolidation_prompt, session)
+        consolidated_raw = review_with_cortex(MODEL, consolidation_prompt)
         
         print(f"  📄 Raw response length: {len(consolidated_raw)} characters")
         print(f"  📄 Raw response preview: {consolidated_raw[:500]}...")
@@ -592,13 +969,14 @@ def main():
             print(f"  🔧 Attempting to extract JSON from response...")
             
             # Try to find JSON block in the response
-            json_match = re.search(r'\{.*\}', consolidated_raw, re.DOTALL)
-            if json_match:
+            json_start = consolidated_raw.find('{')
+            if json_start >= 0:
                 try:
-                    consolidated_json = json.loads(json_match.group())
+                    consolidated_json, _ = JSON_DECODER.raw_decode(consolidated_raw, json_start)
                     print("  ✅ Successfully extracted JSON from response")
                 except json.JSONDecodeError:
                     print("  ❌ Failed to parse extracted JSON, using fallback")
+                    discard_cortex_response(MODEL, consolidation_prompt)  # retried on the next run, not replayed
                     consolidated_json = {
                         "executive_summary": "Consolidation failed - using fallback",
                         "quality_score": 75,
@@ -619,6 +997,7 @@ def main():
                     }
             else:
                 print("  ❌ No JSON found in response, using fallback")
+                discard_cortex_response(MODEL, consolidation_prompt)
                 consolidated_json = {
                     "executive_summary": "Consolidation failed - no valid JSON found in response",
                     "quality_score": 50,
@@ -663,42 +1042,46 @@ def main():
                 consolidated_json[field] = default_value
                 print(f"  🔧 Added missing field: {field}")
 
-        executive_summary = format_executive_pr_display(consolidated_json, processed_files)
+        # Canonicalize severities once so display, extraction and stats compare them directly
+        findings = normalize_finding_severities(consolidated_json["detailed_findings"])
+        # One walk over the findings feeds the summary and the critical/high extraction
+        partitioned_findings = partition_findings_by_severity(findings)
+        buckets = partitioned_findings[0]
+
+        # Single clock read shared by the summary and review_output.json
+        generated_at = datetime.now()
+        executive_summary = format_executive_pr_display(consolidated_json, processed_files, generated_at, partitioned_findings)
         
         consolidated_path = os.path.join(output_folder_path, "consolidated_executive_summary.md")
-        with open(consolidated_path, 'w', encoding='utf-8') as f:
-            f.write(executive_summary)
+        write_text_file(consolidated_path, executive_summary)
         print(f"  ✅ Executive summary saved: consolidated_executive_summary.md")
 
         json_path = os.path.join(output_folder_path, "consolidated_data.json")
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(consolidated_json, f, indent=2)
+        write_json_file(json_path, consolidated_json)
         print(f"  ✅ JSON data saved: consolidated_data.json")
 
         # Generate review_output.json for inline_comment.py compatibility
         criticals = []
         highs = []
         
-        for f in consolidated_json.get("detailed_findings", []):
-            severity_lower = str(f.get("severity", "")).lower()
-            if severity_lower == "critical":
-                critical = {
-                    "line": f.get("line_number", 1),
-                    "issue": f.get("finding", "Critical issue found"),
-                    "recommendation": f.get("recommendation", f.get("finding", "")),
-                    "severity": f.get("severity", "Critical"),
-                    "filename": f.get("filename", "unknown")
-                }
-                criticals.append(critical)
-            elif severity_lower == "high":
-                high = {
-                    "line": f.get("line_number", 1),
-                    "issue": f.get("finding", "High priority issue found"),
-                    "recommendation": f.get("recommendation", f.get("finding", "")),
-                    "severity": f.get("severity", "High"),
-                    "filename": f.get("filename", "unknown")
-                }
-                highs.append(high)
+        for f in buckets["Critical"]:
+            critical = {
+                "line": f.get("line_number", 1),
+                "issue": f.get("finding", "Critical issue found"),
+                "recommendation": f.get("recommendation", f.get("finding", "")),
+                "severity": f.get("severity", "Critical"),
+                "filename": f.get("filename", "unknown")
+            }
+            criticals.append(critical)
+        for f in buckets["High"]:
+            high = {
+                "line": f.get("line_number", 1),
+                "issue": f.get("finding", "High priority issue found"),
+                "recommendation": f.get("recommendation", f.get("finding", "")),
+                "severity": f.get("severity", "High"),
+                "filename": f.get("filename", "unknown")
+            }
+            highs.append(high)
 
         review_output_data = {
             "full_review": executive_summary,
@@ -708,14 +1091,13 @@ def main():
             "highs": highs,
             "file": processed_files[0] if processed_files else "unknown",
             "files_analyzed": processed_files,
-            "timestamp": datetime.now().isoformat(),
-            "total_findings": len(consolidated_json.get("detailed_findings", [])),
+            "timestamp": generated_at.isoformat(),
+            "total_findings": len(findings),
             "critical_count": len(criticals),
             "high_count": len(highs)
         }
 
-        with open("review_output.json", "w", encoding='utf-8') as f:
-            json.dump(review_output_data, f, indent=2, ensure_ascii=False)
+        write_json_file("review_output.json", review_output_data)
         print("  ✅ review_output.json saved for inline_comment.py compatibility")
 
         # Store current review for future comparisons
@@ -729,9 +1111,9 @@ def main():
                     pull_request_number, 
                     commit_sha, 
                     executive_summary[:8000],  # Truncate for storage
-                    json.dumps(consolidated_json.get("detailed_findings", []))
+                    json.dumps(findings)
                 ]
-                session.sql(insert_sql, params=params).collect()
+                get_session().sql(insert_sql, params=params).collect()
                 print(f"  ✅ Current review stored for future comparisons")
             except Exception as e:
                 print(f"  Warning: Could not store review: {e}")
@@ -740,14 +1122,16 @@ def main():
             delimiter = str(uuid.uuid4())
             with open(os.environ['GITHUB_OUTPUT'], 'a') as gh_out:
                 gh_out.write(f'consolidated_summary_text<<{delimiter}\n')
-                gh_out.write(f'{executive_summary}\n')
+                gh_out.write(executive_summary)  # written as-is rather than copied into a new string with the newline
+                gh_out.write('\n')
                 gh_out.write(f'{delimiter}\n')
             print("  ✅ GitHub Actions output written")
 
         # Enhanced completion summary
-        findings_count = len(consolidated_json.get("detailed_findings", []))
-        critical_count = len([f for f in consolidated_json.get("detailed_findings", []) if str(f.get("severity", "")).lower() == "critical"])
-        high_count = len([f for f in consolidated_json.get("detailed_findings", []) if str(f.get("severity", "")).lower() == "high"])
+        findings_count = len(findings)
+        # Severity totals come from the buckets partitioned above, not another walk over the findings
+        critical_count = len(buckets["Critical"])
+        high_count = len(buckets["High"])
         
         print(f"\n🎉 TWO-STAGE ANALYSIS COMPLETED!")
         print("=" * 60)
@@ -786,6 +1170,6 @@ if __name__ == "__main__":
     try:
         main()
     finally:
-        if 'session' in locals():
+        if session is not None:
             session.close()
             print("\n🔒 Session closed")
@@ -54,11 +54,11 @@ def extract_pr_diffs(base_branch="origin/main", specific_file=None):
     if current_file and buffer:
         file_diffs[current_file] = "\n".join(buffer)
     
-    output = f"### Last Commit Changes for {specific_file or 'All Python Files'}\n\n"
+    output_parts = [f"### Last Commit Changes for {specific_file or 'All Python Files'}\n\n"]
     for fname, diff in file_diffs.items():
-        output += f"#### File: `{fname}`\n```diff\n{diff}\n```\n\n"
+        output_parts.append(f"#### File: `{fname}`\n```diff\n{diff}\n```\n\n")
     
-    return output
+    return "".join(output_parts)
 
 if __name__ == "__main__":  # Fixed the syntax error
     specific_file = sys.argv[1] if len(sys.argv) > 1 else None
@@ -1,9 +1,8 @@
 import os
 import subprocess
 import requests
-import json
 import re
-from typing import List, Dict, Optional
+from typing import List, Dict
 from dataclasses import dataclass
 
 @dataclass
@@ -15,19 +14,29 @@ class CodeIssue:
     rule: str
 
 class CodeAnalyzer:
-    def __init__(self):
-        self.rules = {
-            'missing_docstring': {
-                'pattern': r'^def\s+\w+\([^)]*\):\s*$',
-                'message': 'Consider adding a docstring to document this function.',
-                'severity': 'suggestion'
-            },
-            'hardcoded_strings': {
-                'pattern': r'print\([\'"][^\'\"]*[\'\"]\)',
-                'message': 'Consider using constants for hardcoded strings.',
-                'severity': 'suggestion'
-            }
+    rules = {
+        'missing_docstring': {
+            'pattern': r'^def\s+\w+\([^)]*\):\s*$',
+            'literal': 'def',
+            'message': 'Consider adding a docstring to document this function.',
+            'severity': 'suggestion'
+        },
+        'hardcoded_strings': {
+            'pattern': r'print\([\'"][^\'\"]*[\'\"]\)',
+            'literal': 'print(',
+            'message': 'Consider using constants for hardcoded strings.',
+            'severity': 'suggestion'
         }
+    }
+    # Fuse the pattern rules into one alternation so each line is scanned once;
+    # the named group that matched identifies the rule. Built once at class definition and
+    # shared by every analyzer, as the rules are fixed
+    combined_pattern = re.compile('|'.join(
+        f"(?P<{rule_name}>{rule_config['pattern']})"
+        for rule_name, rule_config in rules.items() if 'pattern' in rule_config
+    ))
+    # Text every pattern rule needs verbatim; most changed lines contain none of it and skip the regex
+    pattern_literals = tuple(rule_config['literal'] for rule_config in rules.values() if 'pattern' in rule_config)
     
     def analyze_file_content(self, file_path: str, content: str, diff_lines: List[int]) -> List[CodeIssue]:
         issues = []
@@ -38,9 +47,13 @@ class CodeAnalyzer:
                 continue
                 
             line = lines[line_num - 1].strip()
+            if any(literal in line for literal in self.pattern_literals):
+                matched_rules = {match.lastgroup for match in self.combined_pattern.finditer(line)}
+            else:
+                matched_rules = set()
             
             for rule_name, rule_config in self.rules.items():
-                if 'pattern' in rule_config and re.search(rule_config['pattern'], line):
+                if rule_name in matched_rules:
                     issues.append(CodeIssue(
                         file_path=file_path,
                         line_number=line_num,
@@ -71,7 +71,8 @@ if __name__ == "__main__":
         print(f"Found {len(review_data['criticals'])} critical issues")
         
         # Post overall PR review comment
-        review_body = f"""## Automated LLM Code Review
+        # Collect the parts and join once: the body embeds the full review, which every += would recopy
+        review_parts = [f"""## Automated LLM Code Review
 
 **File Reviewed:** {review_data['file']}
 **Critical Issues Found:** {len(review_data['criticals'])}
@@ -80,12 +81,13 @@ if __name__ == "__main__":
 {review_data['full_review']}
 
 ### Critical Issues Summary:
-"""
+"""]
         
         for critical in review_data['criticals']:
-            review_body += f"- **Line {critical['line']}:** {critical['issue']}\n"
+            review_parts.append(f"- **Line {critical['line']}:** {critical['issue']}\n")
         
-        review_body += "\n*Critical issues are also posted as inline comments on specific lines.*"
+        review_parts.append("\n*Critical issues are also posted as inline comments on specific lines.*")
+        review_body = "".join(review_parts)
         
         post_pr_comment(review_body)
         
@@ -10,21 +10,21 @@ MANUAL_TARGET_LINES = [5, 11, 13]   # <— EDIT THIS LIST to whatever lines you
 def chunk_full_file(text: str, max_chars: int):
     lines = text.splitlines()
     cur_start = 1
-    cur_text  = ""
+    cur_lines = []  # joined once per chunk rather than re-copying the chunk text on every line
     cur_len   = 0
     for i, line in enumerate(lines, start=1):
         stamped = f"{i}:{line}"
         add_len = len(stamped) + 1
-        if cur_len + add_len > max_chars and cur_text:
-            yield (cur_start, i-1, cur_text)
+        if cur_len + add_len > max_chars and cur_lines:
+            yield (cur_start, i-1, "\n".join(cur_lines))
             cur_start = i
-            cur_text  = stamped
+            cur_lines = [stamped]
             cur_len   = add_len
         else:
-            cur_text  = (cur_text + "\n" if cur_text else "") + stamped
+            cur_lines.append(stamped)
             cur_len  += add_len
-    if cur_text:
-        yield (cur_start, len(lines), cur_text)
+    if cur_lines:
+        yield (cur_start, len(lines), "\n".join(cur_lines))
 
 def main():
     if not os.path.exists(TARGET_FILE):
@@ -1,8 +1,11 @@
-import os, sys, json, re, uuid, glob
+import os, sys, json, re, uuid, glob, hashlib
 from pathlib import Path
-from snowflake.snowpark import Session
-import pandas as pd
 from datetime import datetime
+from itertools import chain, islice
+from functools import lru_cache
+from collections import Counter, deque
+from string import Template
+from concurrent.futures import ThreadPoolExecutor
 
 # ---------------------
 # Config
@@ -11,24 +14,57 @@ MODEL = "openai-gpt-4.1"
 COMPARISON_MODEL = "claude-3-5-sonnet"
 MAX_CHARS_FOR_FINAL_SUMMARY_FILE = 65000
 MAX_TOKENS_FOR_SUMMARY_INPUT = 100000
+MAX_CHARS_FOR_PREVIOUS_SUMMARY = 1500  # previous review summary carried into the comparison context
 
 # Dynamic file pattern - processes all Python AND SQL files in scripts directory
 SCRIPTS_DIRECTORY = "scripts"  # Base directory to scan
 FILE_PATTERNS = ["*.py", "*.sql"]  # CHANGED: Added SQL files
 
+# JSON outputs are read by tooling (inline_comment.py); pretty-print them only when CORTEX_DEBUG is set
+CORTEX_DEBUG = bool(os.environ.get("CORTEX_DEBUG"))
+
+# On-disk cache of Cortex responses keyed by model + prompt, so re-runs on unchanged code skip the round trip.
+# Caching is off unless CORTEX_CACHE_DIR names a directory: cache keys are computable from public inputs,
+# so a default inside the checkout could be seeded with responses by the code under review
+CORTEX_CACHE_DIR = Path(os.environ["CORTEX_CACHE_DIR"]) if os.environ.get("CORTEX_CACHE_DIR") else None
+CORTEX_CACHE_MAX_ENTRIES = 256  # oldest (by last use) entries are evicted beyond this
+# COMPLETE queries allowed in flight at once; before another is sent the oldest is collected, so a
+# large PR does not queue dozens of concurrent queries on one session and warehouse
+CORTEX_MAX_IN_FLIGHT = 4
+cortex_jobs_in_flight = deque()  # finish() callables of submitted, not yet collected queries
+
+# Severity levels reported in the executive summary
+SEVERITY_LEVELS = ("Critical", "High", "Medium", "Low")
+# Points deducted per issue by calculate_executive_quality_score (before its caps)
+SEVERITY_WEIGHTS = {
+    "Critical": 12,    # Each critical issue deducts 12 points (but there should be very few)
+    "High": 4,         # Each high issue deducts 4 points
+    "Medium": 1.5,     # Each medium issue deducts 1.5 points
+    "Low": 0.3         # Each low issue deducts 0.3 points
+}
+
+# Patterns for recovering JSON from free-form LLM responses, compiled once at import
+JSON_CODE_BLOCK_RE = re.compile(r'```json\s*(\{.*?\})\s*```', re.DOTALL)
+JSON_CANDIDATE_RE = re.compile(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', re.DOTALL)
+# Common malformations, repaired in one scan: a trailing comma before } or ], or an unquoted key
+JSON_REPAIR_RE = re.compile(r',(\s*[}\]])|(\w+):')
+JSON_DECODER = json.JSONDecoder()  # raw_decode() parses an embedded object in place, no slicing
+
 # ---------------------
 # Snowflake session
 # ---------------------
+# Connection settings come from the SNOWFLAKE_* variables the workflow exports from repository
+# secrets; the password has no default, so it never lives in the source. The role stays pinned:
+# the account's configured role is ORGADMIN, which this script deliberately moved away from
 cfg = {
-    "account": "XKB93357.us-west-2",
-    "user": "MANISHAT007", 
-    "password": "Welcome@987654321",
+    "account": os.environ.get("SNOWFLAKE_ACCOUNT") or "XKB93357.us-west-2",
+    "user": os.environ.get("SNOWFLAKE_USER") or "MANISHAT007",
+    "password": os.environ.get("SNOWFLAKE_PASSWORD"),
     "role": "SYSADMIN",  # ONLY CHANGE: from ORGADMIN to SYSADMIN
-    "warehouse": "COMPUTE_WH",
-    "database": "MY_DB",
-    "schema": "PUBLIC",
+    "warehouse": os.environ.get("SNOWFLAKE_WAREHOUSE") or "COMPUTE_WH",
+    "database": os.environ.get("SNOWFLAKE_DATABASE") or "MY_DB",
+    "schema": os.environ.get("SNOWFLAKE_SCHEMA") or "PUBLIC",
 }
-session = Session.builder.configs(cfg).create()
 
 # FIX DATABASE PERMISSIONS AND SETUP: Enhanced approach
 database_available = False
@@ -94,8 +130,25 @@ def setup_database_with_fallback():
     database_available = False
     return False
 
-# Setup database
-setup_database_with_fallback()
+session = None
+
+def get_session():
+    """Return the shared Snowpark session, logging in on first use.
+
+    Snowpark is imported here rather than at module load, so runs served
+    entirely from the Cortex response cache (or that exit before any
+    Snowflake work) skip both the import and the login round trip. A
+    driver that already holds an active session in this process (or sets
+    the module's session before calling main) has it reused, not a new login.
+    A session that has since been closed is replaced; the check is local to
+    the connector, so reuse costs no round trip.
+    """
+    global session
+    if session is None or session.connection.is_closed():
+        from snowflake.snowpark import Session
+        session = Session.builder.configs(cfg).getOrCreate()
+        setup_database_with_fallback()
+    return session
 
 # ---------------------
 # PROMPT TEMPLATES
@@ -294,32 +347,133 @@ Provide your analysis in a structured JSON format. For each major issue identifi
 - **"NO_LONGER_APPLICABLE"**: The code related to the original feedback was removed or changed so significantly that the feedback doesn't apply.
 
 The JSON output should follow this exact structure:
-{{
+{
   "comparison_summary": "A brief, one-sentence summary of whether the developer addressed the feedback.",
   "issue_status": [
-    {{
+    {
       "issue": "A concise summary of the original issue from the previous review.",
       "line_number": "Line number from the original issue if available, otherwise 'N/A'",
       "filename": "Filename from the original issue if available, otherwise 'N/A'",
       "status": "RESOLVED | PARTIALLY_RESOLVED | NOT_ADDRESSED | WORSENED | NO_LONGER_APPLICABLE",
       "reasoning": "A brief explanation for your status decision, referencing the new review."
-    }}
+    }
   ],
   "new_issues_introduced": [
-    {{
+    {
       "issue": "Description of any new issues found in the new review that weren't in the previous review",
       "severity": "Critical | High | Medium | Low",
       "line_number": "Line number if available",
       "filename": "Filename if available"
-    }}
+    }
   ],
   "overall_improvement": "IMPROVED | NEUTRAL | WORSENED",
   "quality_trend": "Quality score trend analysis comparing previous vs current review"
-}}
+}
 
 STRICTLY provide the result within 3000 characters. DO NOT exceed the character limit.
 """
 
+# Prompts compiled once at import
+def prompt_template(text: str, *fields: str) -> Template:
+    """Compile a prompt with {field} placeholders into a string.Template.
+
+    Every field is then filled in one substitute() pass at call time, instead of one
+    full-prompt replace() copy per placeholder (and substituted values are never re-scanned).
+    """
+    for field in fields:
+        text = text.replace("{" + field + "}", "${" + field + "}")
+    return Template(text)
+
+# Static parts (the shared consolidated body and its character budget) are filled in once here
+CONSOLIDATED_PROMPT_TEXT = PROMPT_TEMPLATE_CONSOLIDATED.replace("{MAX_CHARS_FOR_FINAL_SUMMARY_FILE}", str(MAX_CHARS_FOR_FINAL_SUMMARY_FILE))
+# The reviews are its only field, so like the individual prompt it is split around them once
+CONSOLIDATED_PROMPT_HEAD, CONSOLIDATED_PROMPT_TAIL = CONSOLIDATED_PROMPT_TEXT.split("{ALL_REVIEWS_CONTENT}", 1)
+CONTEXT_PROMPT = prompt_template(
+    PROMPT_TEMPLATE_WITH_CONTEXT.replace("{consolidated_template}", CONSOLIDATED_PROMPT_TEXT),
+    "previous_context", "pr_number", "ALL_REVIEWS_CONTENT",
+)
+# The source goes last, so split the individual prompt around it once, and the head around its
+# only field (the filename): a build is then a single join of static segments and the two inputs,
+# with the (possibly large) code never scanned or copied twice
+INDIVIDUAL_PROMPT_HEAD, INDIVIDUAL_PROMPT_TAIL = PROMPT_TEMPLATE_INDIVIDUAL.split("{PY_CONTENT}", 1)
+INDIVIDUAL_PROMPT_LEAD, INDIVIDUAL_PROMPT_HEAD = INDIVIDUAL_PROMPT_HEAD.split("{filename}", 1)
+COMPARE_REVIEWS_PROMPT = prompt_template(PROMPT_TO_COMPARE_REVIEWS, "previous_review_text", "new_review_text")
+
+# ---------------------
+# REPORT TEMPLATES
+# ---------------------
+# Emoji lookup tables, shared by every report instead of rebuilt per row
+QUALITY_EMOJI_BANDS = ((80, "🟢"), (60, "🟡"), (float("-inf"), "🔴"))
+RISK_EMOJI = {"LOW": "🟢", "MEDIUM": "🟡", "HIGH": "🟠", "CRITICAL": "🔴"}
+STATUS_EMOJI = {"RESOLVED": "✅", "PARTIALLY_RESOLVED": "⚠️", "NOT_ADDRESSED": "❌", "WORSENED": "🔴"}
+PRIORITY_EMOJI = {"Critical": "🔴", "High": "🟠", "Medium": "🟡", "Low": "🟢"}
+# Model text in table cells: a pipe would split the cell (inside code spans too), so it is always
+# escaped; "<" could open raw HTML, but GitHub shows entities inside `code spans` literally, so it is
+# only escaped outside them (see escape_table_cell)
+TABLE_CELL_ESCAPES = str.maketrans({"|": "\\|"})
+CODE_SPAN_RE = re.compile(r"(`+).+?(?<!`)\1(?!`)", re.DOTALL)
+
+# Static markdown for the executive summary, built once at import; only the
+# placeholders are filled per report.
+REPORT_TEMPLATE_HEADER = """# 📊 Executive Code Review Report
+
+**Files Analyzed:** {file_count} files | **Analysis Date:** {analysis_date} | **Database:** {database}.{schema}
+
+## 🎯 Executive Summary
+{summary}
+
+## 📈 Quality Dashboard
+
+| Metric | Score | Status | Business Impact |
+|--------|-------|--------|-----------------|
+| **Overall Quality** | {quality_score}/100 | {quality_emoji} | {business_impact} Risk |
+| **Security Risk** | {security_risk} | {security_emoji} | Critical security concerns |
+| **Technical Debt** | {tech_debt} | {tech_debt_emoji} | {findings_count} items |
+| **Maintainability** | {maintainability} | {maintainability_emoji} | Long-term sustainability |
+
+## 🔍 Issue Distribution
+
+| Severity | Count | Priority Actions |
+|----------|-------|------------------|
+| 🔴 Critical | {critical_count} | Immediate fix required |
+| 🟠 High | {high_count} | Fix within sprint |
+| 🟡 Medium | {medium_count} | Plan for next release |
+| 🟢 Low | {low_count} | Technical improvement |
+
+## 📁 File Analysis Breakdown
+
+| File Type | Count | Critical Issues | High Issues |
+|-----------|-------|----------------|-------------|
+| 🐍 Python | {python_file_count} | {python_critical} | {python_high} |
+| 🗄️ SQL | {sql_file_count} | {sql_critical} | {sql_high} |
+
+"""
+
+REPORT_SECTION_PREVIOUS_ISSUES = """<details>
+<summary><strong>📈 Previous Issues Resolution Status</strong> (Click to expand)</summary>
+
+| Previous Issue | File | Line | Status | Details |
+|----------------|------|------|--------|---------|
+"""
+
+REPORT_SECTION_FINDINGS = """<details>
+<summary><strong>🔍 Current Review Findings</strong> (Click to expand)</summary>
+
+| Priority | File | Line | Issue | Business Impact |
+|----------|------|------|-------|-----------------|
+"""
+
+REPORT_SECTION_ACTIONS = """<details>
+<summary><strong>⚡ Immediate Actions Required</strong> (Click to expand)</summary>
+
+"""
+
+REPORT_TEMPLATE_FOOTER = """---
+
+**📋 Review Summary:** {findings_count} findings identified | **🎯 Quality Score:** {quality_score}/100 | **⚡ Critical Issues:** {critical_count}
+
+*🔬 Powered by Snowflake Cortex AI • Two-Stage Executive Analysis • Stored in {database}.{schema}*"""
+
 def get_changed_python_files(folder_path=None):
     """
     Dynamically get all Python AND SQL files from the specified folder or scripts directory.
@@ -337,15 +491,10 @@ def get_changed_python_files(folder_path=None):
     
     # Process both Python and SQL files
     for pattern in FILE_PATTERNS:
-        # Use glob pattern to find files
-        pattern_path = os.path.join(folder_path, pattern)
-        found_files = glob.glob(pattern_path)
-        
-        # Also check subdirectories recursively
+        # One recursive glob per pattern: "**" also matches zero directories, so the
+        # top-level files are found by the same scan as those in subdirectories
         recursive_pattern = os.path.join(folder_path, "**", pattern)
-        found_files.extend(glob.glob(recursive_pattern, recursive=True))
-        
-        all_files.extend(found_files)
+        all_files.extend(glob.glob(recursive_pattern, recursive=True))
     
     # Remove duplicates and sort
     all_files = sorted(list(set(all_files)))
@@ -358,31 +507,105 @@ def get_changed_python_files(folder_path=None):
     return all_files
 
 def build_prompt_for_individual_review(code_text: str, filename: str = "code_file") -> str:
-    prompt = PROMPT_TEMPLATE_INDIVIDUAL.replace("{PY_CONTENT}", code_text)
-    prompt = prompt.replace("{filename}", filename)
-    return prompt
+    return "".join((INDIVIDUAL_PROMPT_LEAD, filename, INDIVIDUAL_PROMPT_HEAD, code_text, INDIVIDUAL_PROMPT_TAIL))
 
 def build_prompt_for_consolidated_summary(all_reviews_content: str, previous_context: str = None, pr_number: int = None) -> str:
     if previous_context and pr_number:
-        prompt = PROMPT_TEMPLATE_WITH_CONTEXT.replace("{previous_context}", previous_context)
-        prompt = prompt.replace("{pr_number}", str(pr_number))
-        prompt = prompt.replace("{consolidated_template}", PROMPT_TEMPLATE_CONSOLIDATED)
-        prompt = prompt.replace("{ALL_REVIEWS_CONTENT}", all_reviews_content)
-    else:
-        prompt = PROMPT_TEMPLATE_CONSOLIDATED.replace("{ALL_REVIEWS_CONTENT}", all_reviews_content)
-    return prompt
+        return CONTEXT_PROMPT.substitute(previous_context=previous_context, pr_number=pr_number, ALL_REVIEWS_CONTENT=all_reviews_content)
+    return "".join((CONSOLIDATED_PROMPT_HEAD, all_reviews_content, CONSOLIDATED_PROMPT_TAIL))
+
+@lru_cache(maxsize=8)
+def cortex_cache_seed(model):
+    """BLAKE2b state already fed the model, hashed once per model."""
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(str(model).encode('utf-8'))
+    digest.update(b"\0")
+    return digest
 
-def review_with_cortex(model, prompt_text: str, session) -> str:
+def cortex_cache_path(model, prompt_text: str) -> Path:
+    """Cache file for a model/prompt pair, named by a short BLAKE2b digest of both.
+
+    Only the prompt is hashed here; the model comes from a copy of the seed.
+    """
+    digest = cortex_cache_seed(model).copy()
+    digest.update(prompt_text.encode('utf-8'))
+    return CORTEX_CACHE_DIR / f"{digest.hexdigest()}.txt"
+
+def store_cortex_response(cache_path: Path, response: str) -> None:
+    """Atomically write a response to the cache and evict least recently used entries."""
     try:
-        clean_prompt = prompt_text.replace("'", "''").replace("\\", "\\\\")
-        query = f"SELECT SNOWFLAKE.CORTEX.COMPLETE('{model}', '{clean_prompt}') as response"
-        df = session.sql(query)
-        result = df.collect()[0][0]
-        return result
-    except Exception as e:
+        CORTEX_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_bytes(response.encode('utf-8'))
+        os.replace(tmp_path, cache_path)
+        entries = sorted(CORTEX_CACHE_DIR.glob("*.txt"), key=lambda p: p.stat().st_mtime)
+        for stale in entries[:-CORTEX_CACHE_MAX_ENTRIES]:
+            stale.unlink(missing_ok=True)
+    except OSError as e:
+        print(f"Warning: could not cache Cortex response: {e}", file=sys.stderr)
+
+def discard_cortex_response(model, prompt_text: str) -> None:
+    """Drop a cached response the caller could not use, so the next run asks Cortex again."""
+    if CORTEX_CACHE_DIR is None:
+        return
+    try:
+        cortex_cache_path(model, prompt_text).unlink(missing_ok=True)
+    except OSError as e:
+        print(f"Warning: could not drop cached Cortex response: {e}", file=sys.stderr)
+
+def start_cortex_review(model, prompt_text: str, session=None):
+    """Submit a Cortex completion without waiting for it; returns a callable that yields the text.
+
+    Cache hits (when CORTEX_CACHE_DIR is set) resolve immediately. Misses are sent with collect_nowait(), so the caller can
+    prepare and submit further prompts while Cortex generates, and collect the results later.
+    At most CORTEX_MAX_IN_FLIGHT misses are outstanding: past that, the oldest is collected
+    first. The returned callable keeps its result, so calling it again is free.
+    """
+    cache_path = cortex_cache_path(model, prompt_text) if CORTEX_CACHE_DIR is not None else None
+    if cache_path is not None:
+        try:
+            cached = cache_path.read_bytes().decode('utf-8')
+            os.utime(cache_path)  # mark as recently used for eviction
+            return lambda: cached
+        except (OSError, UnicodeDecodeError):
+            pass
+
+    def failed(e) -> str:
         print(f"Error calling Cortex complete for model '{model}': {e}", file=sys.stderr)
         return f"ERROR: Could not get response from Cortex. Reason: {e}"
 
+    while len(cortex_jobs_in_flight) >= CORTEX_MAX_IN_FLIGHT:
+        cortex_jobs_in_flight[0]()  # collecting a query takes it out of the window
+
+    try:
+        session = session or get_session()  # cache misses are the first point Cortex needs a login
+        # Bind model and prompt as parameters so the prompt is sent verbatim, without escaping copies
+        df = session.sql("SELECT SNOWFLAKE.CORTEX.COMPLETE(?, ?) as response", params=[model, prompt_text])
+        job = df.limit(1).collect_nowait()  # single scalar row; the query runs while the caller carries on
+    except Exception as e:
+        error_text = failed(e)
+        return lambda: error_text
+
+    collected = []
+
+    def finish() -> str:
+        if not collected:
+            cortex_jobs_in_flight.remove(finish)
+            try:
+                result = job.result()[0][0]
+                if result and cache_path is not None:
+                    store_cortex_response(cache_path, result)
+            except Exception as e:
+                result = failed(e)
+            collected.append(result)
+        return collected[0]
+
+    cortex_jobs_in_flight.append(finish)
+    return finish
+
+def review_with_cortex(model, prompt_text: str, session=None) -> str:
+    return start_cortex_review(model, prompt_text, session)()
+
 def chunk_large_file(code_text: str, max_chunk_size: int = 50000) -> list:
     if len(code_text) <= max_chunk_size:
         return [code_text]
@@ -407,7 +630,76 @@ def chunk_large_file(code_text: str, max_chunk_size: int = 50000) -> list:
     
     return chunks
 
-def calculate_executive_quality_score(findings: list, total_lines_of_code: int) -> int:
+def fit_reviews_to_token_budget(reviews: list, prompt_without_reviews: str, max_tokens: int = MAX_TOKENS_FOR_SUMMARY_INPUT) -> str:
+    """Serialize the reviews for the consolidation prompt, trimming feedback so the prompt fits max_tokens.
+
+    The budget covers the whole prompt: the template (and any previous-review context) passed in
+    as prompt_without_reviews, plus the reviews exactly as serialized, JSON keys and escaping
+    included. A token spans at least one UTF-8 byte, so a prompt whose byte length already fits
+    skips the tokenizer, and bytes stand in for tokens when tiktoken is not installed. Otherwise
+    the feedback budget is shared out so short reviews are kept whole and only the longest ones
+    are cut, on a token boundary, and the serialized result is re-counted until it fits.
+    """
+    combined = json.dumps(reviews, indent=2)
+    if len(prompt_without_reviews.encode('utf-8')) + len(combined.encode('utf-8')) <= max_tokens:
+        return combined
+
+    try:
+        import tiktoken
+        tokenizer = tiktoken.get_encoding("cl100k_base")
+        def encode(text: str):
+            return tokenizer.encode(text, disallowed_special=())
+        decode = tokenizer.decode
+    except ImportError:
+        # Without tiktoken, budget UTF-8 bytes instead: never fewer than the tokens, so the prompt
+        # is trimmed a little more than needed but still fits, and the summary is not lost
+        print("  ⚠️ tiktoken not installed; budgeting the consolidation prompt by bytes", file=sys.stderr)
+        def encode(text: str):
+            return text.encode('utf-8')
+        def decode(data: bytes) -> str:
+            return data.decode('utf-8', errors='ignore')  # a cut can split a multi-byte character
+    def count_tokens(text: str) -> int:
+        return len(encode(text))
+
+    reviews_budget = max_tokens - count_tokens(prompt_without_reviews)
+    excess = count_tokens(combined) - reviews_budget
+    if excess <= 0:
+        return combined
+
+    token_ids = [encode(r["review_feedback"]) for r in reviews]
+    kept_tokens = {i: len(ids) for i, ids in enumerate(token_ids)}
+    feedback_budget = sum(kept_tokens.values())
+    order = sorted(kept_tokens, key=kept_tokens.get)
+    # Tokens the serialized reviews cost with no feedback at all (keys, filenames, indentation)
+    serialized_overhead = count_tokens(json.dumps([{**r, "review_feedback": ""} for r in reviews], indent=2))
+    # Escaping makes serialized feedback longer than its raw tokens, so scale the raw budget by the
+    # share of the serialized feedback that fits (always dropping at least one token), and re-count
+    # until the serialized reviews fit or nothing is left to cut
+    while excess > 0 and feedback_budget > 0:
+        serialized_feedback = reviews_budget + excess - serialized_overhead
+        scaled_budget = feedback_budget * max(0, reviews_budget - serialized_overhead) // max(1, serialized_feedback)
+        feedback_budget = max(0, min(feedback_budget - 1, scaled_budget))
+        # Hand each review an equal share of what is left, shortest first, so unused shares carry over
+        remaining = feedback_budget
+        for position, i in enumerate(order):
+            kept_tokens[i] = min(len(token_ids[i]), remaining // (len(order) - position))
+            remaining -= kept_tokens[i]
+        fitted = [
+            {**review, "review_feedback": decode(token_ids[i][:kept_tokens[i]]) + "\n... [truncated]"}
+            if kept_tokens[i] < len(token_ids[i]) else review
+            for i, review in enumerate(reviews)
+        ]
+        combined = json.dumps(fitted, indent=2)
+        excess = count_tokens(combined) - reviews_budget
+
+    for i, review in enumerate(reviews):
+        if kept_tokens[i] < len(token_ids[i]):
+            print(f"  ⚠️ Review for {review['filename']} truncated from {len(token_ids[i])} to {kept_tokens[i]} tokens")
+    if excess > 0:
+        print(f"  ⚠️ Consolidation prompt still exceeds {max_tokens} tokens after trimming every review")
+    return combined
+
+def calculate_executive_quality_score(findings: list, total_lines_of_code: int, partitioned_findings: tuple = None) -> int:
     """
     Executive-level rule-based quality scoring (0-100).
     MUCH MORE BALANCED - Fixed overly harsh scoring.
@@ -423,78 +715,43 @@ def calculate_executive_quality_score(findings: list, total_lines_of_code: int)
     base_score = 100
     total_deductions = 0
     
-    # MUCH MORE BALANCED severity weightings
-    severity_weights = {
-        "Critical": 12,    # Each critical issue deducts 12 points (but there should be very few)
-        "High": 4,         # Each high issue deducts 4 points
-        "Medium": 1.5,     # Each medium issue deducts 1.5 points
-        "Low": 0.3         # Each low issue deducts 0.3 points
-    }
-    
-    # Count issues by severity - STRICT PRECISION (NO CONVERSION)
-    severity_counts = {"Critical": 0, "High": 0, "Medium": 0, "Low": 0}
-    total_affected_lines = 0
+    # Count issues by severity: the counts are the bucket sizes. Severities were canonicalized
+    # case-insensitively at ingest (normalize_finding_severities); anything that is not one of
+    # the four levels stays unranked and is skipped - never converted to another level
+    # (callers that already partitioned the findings pass the result in to avoid another walk)
+    buckets, unranked_findings = partitioned_findings or partition_findings_by_severity(findings)
+    severity_counts = {level: len(buckets[level]) for level in SEVERITY_LEVELS}
+    # Count affected lines (treat N/A as 1 line)
+    total_affected_lines = sum(severity_counts.values())
     
     print(f"  📊 Scoring {len(findings)} findings...")
     
-    for finding in findings:
-        severity = str(finding.get("severity", "")).strip()  # Keep original case
-        
-        # STRICT MATCHING - NO CONVERSION TO MEDIUM
-        if severity == "Critical":
-            severity_counts["Critical"] += 1
-        elif severity == "High":
-            severity_counts["High"] += 1
-        elif severity == "Medium":
-            severity_counts["Medium"] += 1
-        elif severity == "Low":
-            severity_counts["Low"] += 1
-        else:
-            # LOG UNRECOGNIZED SEVERITY BUT DON'T COUNT IT
-            print(f"    ⚠️ UNRECOGNIZED SEVERITY: '{severity}' in finding: {finding.get('finding', 'Unknown')[:50]}... - SKIPPING")
-            continue  # Skip this finding entirely instead of converting
-            
-        print(f"    - {severity}: {finding.get('finding', 'No description')[:50]}...")
-        
-        # Count affected lines (treat N/A as 1 line)
-        line_num = finding.get("line_number", "N/A")
-        total_affected_lines += 1
+    for finding in unranked_findings:
+        # LOG UNRECOGNIZED SEVERITY BUT DON'T COUNT IT
+        print(f"    ⚠️ UNRECOGNIZED SEVERITY: '{finding.get('severity', '')}' in finding: {finding.get('finding', 'Unknown')[:50]}... - SKIPPING")
+    for severity in SEVERITY_LEVELS:
+        for finding in buckets[severity]:
+            print(f"    - {severity}: {finding.get('finding', 'No description')[:50]}...")
     
     print(f"  📈 Severity breakdown: Critical={severity_counts['Critical']}, High={severity_counts['High']}, Medium={severity_counts['Medium']}, Low={severity_counts['Low']}")
     
-    # Calculate REALISTIC deductions from severity
-    for severity, count in severity_counts.items():
-        if count > 0:
-            weight = severity_weights[severity]
-            
-            # MUCH MORE BALANCED progressive penalty
-            if severity == "Critical":
-                # Critical: Should be very rare, but high impact
-                if count <= 2:
-                    deduction = weight * count
-                else:
-                    deduction = weight * 2 + (count - 2) * (weight + 3)
-                # Cap critical deductions at 30 points max
-                deduction = min(30, deduction)
-            elif severity == "High":
-                # High: Linear scaling with small bonus after 10 issues
-                if count <= 10:
-                    deduction = weight * count
-                else:
-                    deduction = weight * 10 + (count - 10) * (weight + 1)
-                # Cap high severity deductions at 25 points max
-                deduction = min(25, deduction)
-            else:
-                # Medium/Low: Pure linear scaling with caps
-                deduction = weight * count
-                # Reasonable caps
-                if severity == "Medium":
-                    deduction = min(20, deduction)
-                else:
-                    deduction = min(10, deduction)
-                
-            total_deductions += deduction
-            print(f"    {severity}: {count} issues = -{deduction:.1f} points (capped)")
+    # Calculate REALISTIC deductions from severity - MUCH MORE BALANCED progressive penalties,
+    # each computed directly instead of branching per severity level
+    critical_count = severity_counts["Critical"]
+    high_count = severity_counts["High"]
+    deductions = {
+        # Critical: should be very rare but high impact; +3 per issue beyond 2, capped at 30
+        "Critical": min(30, SEVERITY_WEIGHTS["Critical"] * critical_count + 3 * max(0, critical_count - 2)),
+        # High: linear with +1 per issue beyond 10, capped at 25
+        "High": min(25, SEVERITY_WEIGHTS["High"] * high_count + max(0, high_count - 10)),
+        # Medium/Low: pure linear scaling with caps
+        "Medium": min(20, SEVERITY_WEIGHTS["Medium"] * severity_counts["Medium"]),
+        "Low": min(10, SEVERITY_WEIGHTS["Low"] * severity_counts["Low"]),
+    }
+    total_deductions += sum(deductions.values())
+    for severity, deduction in deductions.items():
+        if severity_counts[severity] > 0:
+            print(f"    {severity}: {severity_counts[severity]} issues = -{deduction:.1f} points (capped)")
     
     # MUCH REDUCED penalties
     if total_lines_of_code > 0:
@@ -537,15 +794,15 @@ def setup_review_log_table():
         
     try:
         # Check if table exists and has the correct structure
-        check_table_query = f"""
+        check_table_query = """
         SELECT COLUMN_NAME 
         FROM INFORMATION_SCHEMA.COLUMNS 
-        WHERE TABLE_SCHEMA = '{current_schema}' 
+        WHERE TABLE_SCHEMA = ? 
         AND TABLE_NAME = 'CODE_REVIEW_LOG'
         """
         
         try:
-            existing_columns = session.sql(check_table_query).collect()
+            existing_columns = session.sql(check_table_query, params=[current_schema]).collect()
             column_names = [row['COLUMN_NAME'] for row in existing_columns]
             
             # Check if COMPARISON_RESULT column exists
@@ -622,10 +879,10 @@ def store_review_log(pull_request_number, commit_sha, executive_summary, consoli
         verify_query = f"""
         SELECT REVIEW_ID, PULL_REQUEST_NUMBER, COMMIT_SHA, REVIEW_TIMESTAMP
         FROM {current_database}.{current_schema}.CODE_REVIEW_LOG 
-        WHERE PULL_REQUEST_NUMBER = {pull_request_number} AND COMMIT_SHA = '{commit_sha}'
+        WHERE PULL_REQUEST_NUMBER = ? AND COMMIT_SHA = ?
         ORDER BY REVIEW_TIMESTAMP DESC LIMIT 1
         """
-        result = session.sql(verify_query).collect()
+        result = session.sql(verify_query, params=[pull_request_number, commit_sha]).collect()
         
         if result:
             row = result[0]
@@ -656,12 +913,12 @@ def get_previous_review(pull_request_number):
             COMPARISON_RESULT,
             REVIEW_TIMESTAMP
         FROM {current_database}.{current_schema}.CODE_REVIEW_LOG 
-        WHERE PULL_REQUEST_NUMBER = {pull_request_number}
+        WHERE PULL_REQUEST_NUMBER = ?
         ORDER BY REVIEW_TIMESTAMP DESC 
         LIMIT 1
         """
         
-        result = session.sql(query).collect()
+        result = session.sql(query, params=[pull_request_number]).collect()
         
         if result:
             row = result[0]
@@ -669,12 +926,17 @@ def get_previous_review(pull_request_number):
             review_summary = json.loads(str(row['REVIEW_SUMMARY'])) if row['REVIEW_SUMMARY'] else {}
             findings_json = json.loads(str(row['DETAILED_FINDINGS_JSON'])) if row['DETAILED_FINDINGS_JSON'] else []
             
+            summary_text = json.dumps(review_summary, indent=2)
+            if len(summary_text) > MAX_CHARS_FOR_PREVIOUS_SUMMARY:
+                print(f"  ⚠️ Previous review summary truncated from {len(summary_text)} to {MAX_CHARS_FOR_PREVIOUS_SUMMARY} characters")
+                summary_text = summary_text[:MAX_CHARS_FOR_PREVIOUS_SUMMARY]
+            
             # Build detailed previous context with line numbers and filenames
-            previous_context = f"""Previous Review Summary:
-{json.dumps(review_summary, indent=2)[:1500]}
+            context_parts = [f"""Previous Review Summary:
+{summary_text}
 
 Previous Detailed Findings with Line Numbers and Filenames:
-"""
+"""]
             
             # Include line numbers, filenames and detailed info for each finding
             for i, finding in enumerate(findings_json[:10]):  # Limit to first 10 findings
@@ -683,9 +945,10 @@ Previous Detailed Findings with Line Numbers and Filenames:
                 severity = finding.get('severity', 'Unknown')
                 issue = finding.get('finding', 'No description')[:100]  # Truncate long descriptions
                 
-                previous_context += f"""
+                context_parts.append(f"""
 {i+1}. [{severity}] {filename}:{line_num} - {issue}
-"""
+""")
+            previous_context = "".join(context_parts)
             
             print(f"  📋 Retrieved previous review from {row['REVIEW_TIMESTAMP']} with line numbers and filenames")
             return previous_context
@@ -712,14 +975,17 @@ def get_llm_comparison(model: str, prompt_messages: str, session):
         except json.JSONDecodeError as e:
             print(f"⚠️ JSON parsing failed, attempting to extract JSON from response: {e}")
             # Try to find JSON in the response
-            json_match = re.search(r'\{.*\}', review, re.DOTALL)
-            if json_match:
-                comparison_result = json.loads(json_match.group())
-                print("✅ Successfully extracted JSON from LLM response")
-                return comparison_result
-            else:
-                print("❌ Could not extract valid JSON from LLM response")
-                return None
+            json_start = review.find('{')
+            if json_start >= 0:
+                try:
+                    comparison_result, _ = JSON_DECODER.raw_decode(review, json_start)
+                    print("✅ Successfully extracted JSON from LLM response")
+                    return comparison_result
+                except json.JSONDecodeError:
+                    pass  # an unparseable object is reported like a missing one, not as a failed call
+            print("❌ Could not extract valid JSON from LLM response")
+            discard_cortex_response(model, prompt_messages)  # retried on the next run, not replayed
+            return None
                 
     except Exception as e:
         print(f"❌ Error calling LLM for comparison: {e}")
@@ -739,12 +1005,12 @@ def fetch_last_review_for_comparison(session, pr_number):
             DETAILED_FINDINGS_JSON,
             REVIEW_TIMESTAMP
         FROM {current_database}.{current_schema}.CODE_REVIEW_LOG
-        WHERE PULL_REQUEST_NUMBER = {pr_number}
+        WHERE PULL_REQUEST_NUMBER = ?
         ORDER BY REVIEW_TIMESTAMP DESC
         LIMIT 1
         """
         
-        result = session.sql(query).collect()
+        result = session.sql(query, params=[pr_number]).collect()
         
         if result:
             row = result[0]
@@ -760,7 +1026,112 @@ def fetch_last_review_for_comparison(session, pr_number):
         print(f"❌ Error fetching last review for comparison: {e}")
         return None
 
-def format_executive_pr_display(json_response: dict, processed_files: list) -> str:
+def repair_json_match(match) -> str:
+    """JSON_REPAIR_RE replacement: drop the trailing comma, or quote the bare key."""
+    closing = match.group(1)
+    return closing if closing is not None else f'"{match.group(2)}":'
+
+def read_text_file(path) -> str:
+    """Read a whole UTF-8 file as bytes and decode once, skipping the text-mode IO layer.
+
+    Binary readall() sizes its buffer from fstat, so the file arrives in a single raw read.
+    Line endings are then translated as text mode would (universal newlines), so CRLF files
+    reach the prompts without a carriage return on every line; without any CR the
+    replace() calls return the string itself.
+    """
+    with open(path, 'rb') as f:
+        return f.read().decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+
+def write_text_file(path, text: str) -> None:
+    """Write text as UTF-8 bytes, skipping the text-mode IO wrapper.
+
+    The text is encoded in 64 KiB slices written straight to the file, so a large
+    report never sits in memory twice (the string plus a full bytes copy).
+    """
+    with open(path, 'wb') as f:
+        for start in range(0, len(text), 1 << 16):
+            f.write(text[start:start + (1 << 16)].encode('utf-8'))
+
+def write_json_file(path, data) -> None:
+    """Write data to path as UTF-8 JSON, compact unless CORTEX_DEBUG is set.
+
+    The document is built with a single encode() call, which (for compact output) runs
+    the C encoder; iterencode() always falls back to the pure-Python one. Bytes still go
+    out in slices through write_text_file, so no full bytes copy is held.
+    """
+    if CORTEX_DEBUG:
+        encoder = json.JSONEncoder(indent=2, ensure_ascii=False)
+    else:
+        encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False)
+    write_text_file(path, encoder.encode(data))
+
+def write_outputs(*writes) -> None:
+    """Run independent (writer, path, data) writes on two threads and wait for all of them.
+
+    Encoding holds the GIL but the file writes release it, so one output's disk I/O
+    overlaps the next one's encoding; the first failed write's error is re-raised.
+    """
+    with ThreadPoolExecutor(max_workers=2) as writer:
+        for future in [writer.submit(*write) for write in writes]:
+            future.result()
+
+def normalize_finding_severities(findings: list) -> list:
+    """Canonicalize each finding's severity to Critical/High/Medium/Low casing, in place.
+
+    Run once on the Cortex output so downstream counting and filtering can compare
+    severities directly instead of re-normalizing them per use. Severities that are
+    missing or not one of the four levels are left as reported, so they stay unranked
+    (shown in the findings table, skipped by the scorer) rather than passing as Low.
+    """
+    for f in findings:
+        severity = str(f.get("severity") or "").strip().capitalize()
+        if severity in SEVERITY_LEVELS:
+            f["severity"] = severity
+    return findings
+
+def score_band(score, bands=QUALITY_EMOJI_BANDS) -> str:
+    """Return the label of the first (threshold, label) band the score reaches."""
+    return next(label for threshold, label in bands if score >= threshold)
+
+def escape_table_cell(text: str) -> str:
+    """Escape model text for a markdown table cell without touching what it quotes in backticks.
+
+    Pipes are escaped everywhere; "<" becomes &lt; only outside code spans, where GitHub would
+    otherwise show the entity itself.
+    """
+    if "<" in text:
+        parts = []
+        pos = 0
+        for span in CODE_SPAN_RE.finditer(text):
+            parts.append(text[pos:span.start()].replace("<", "&lt;"))
+            parts.append(span.group())
+            pos = span.end()
+        parts.append(text[pos:].replace("<", "&lt;"))
+        text = "".join(parts)
+    return text.translate(TABLE_CELL_ESCAPES)
+
+@lru_cache(maxsize=16)
+def severity_label(severity: str) -> str:
+    """Emoji-prefixed, escaped severity cell text; memoized since only a handful of severities exist."""
+    return f"{PRIORITY_EMOJI.get(severity, '🟡')} {escape_table_cell(severity)}"
+
+@lru_cache(maxsize=16)
+def status_label(status: str) -> str:
+    """Emoji-prefixed resolution status cell text, memoized like severity_label."""
+    return f"{STATUS_EMOJI.get(status, '❓')} {status}"
+
+def partition_findings_by_severity(findings: list) -> tuple:
+    """Split findings into per-severity buckets plus unrecognized ones, in one pass.
+
+    Returns (buckets, unranked_findings); each list keeps the findings' original order.
+    """
+    buckets = {level: [] for level in SEVERITY_LEVELS}
+    unranked_findings = []
+    for f in findings:
+        buckets.get(str(f.get("severity")), unranked_findings).append(f)  # str(): unranked values may be anything
+    return buckets, unranked_findings
+
+def format_executive_pr_display(json_response: dict, processed_files: list, generated_at: datetime = None, partitioned_findings: tuple = None) -> str:
     summary = json_response.get("executive_summary", "Technical analysis completed")
     findings = json_response.get("detailed_findings", [])
     quality_score = json_response.get("quality_score", 75)
@@ -768,132 +1139,119 @@ def format_executive_pr_display(json_response: dict, processed_files: list) -> s
     security_risk = json_response.get("security_risk_level", "MEDIUM")
     tech_debt = json_response.get("technical_debt_score", "MEDIUM")
     maintainability = json_response.get("maintainability_rating", "FAIR")
-    metrics = json_response.get("metrics", {})
-    strategic_recs = json_response.get("strategic_recommendations", [])
     immediate_actions = json_response.get("immediate_actions", [])
     previous_issues = json_response.get("previous_issues_resolved", [])
     
-    critical_count = sum(1 for f in findings if str(f.get("severity", "")).upper() == "CRITICAL")
-    high_count = sum(1 for f in findings if str(f.get("severity", "")).upper() == "HIGH")
-    medium_count = sum(1 for f in findings if str(f.get("severity", "")).upper() == "MEDIUM")
-    low_count = sum(1 for f in findings if str(f.get("severity", "")).upper() == "LOW")
+    # Count by file type for better reporting: one pass, each name lowercased once
+    file_extension_counts = Counter(os.path.splitext(f)[1].lower() for f in processed_files)
+    
+    # Partition in a single pass; the buckets feed the severity counts, the
+    # per-file-type counts and the severity-ordered findings table
+    # (callers that already partitioned the findings pass the result in to avoid another walk)
+    buckets, unranked_findings = partitioned_findings or partition_findings_by_severity(findings)
     
-    # Count by file type for better reporting
-    python_files = [f for f in processed_files if f.lower().endswith('.py')]
-    sql_files = [f for f in processed_files if f.lower().endswith('.sql')]
+    critical_count = len(buckets["Critical"])
+    high_count = len(buckets["High"])
+    medium_count = len(buckets["Medium"])
+    low_count = len(buckets["Low"])
     
-    # Count critical/high issues by file type
-    python_critical = sum(1 for f in findings if f.get("filename", "").lower().endswith('.py') and str(f.get("severity", "")).upper() == "CRITICAL")
-    python_high = sum(1 for f in findings if f.get("filename", "").lower().endswith('.py') and str(f.get("severity", "")).upper() == "HIGH")
-    sql_critical = sum(1 for f in findings if f.get("filename", "").lower().endswith('.sql') and str(f.get("severity", "")).upper() == "CRITICAL")
-    sql_high = sum(1 for f in findings if f.get("filename", "").lower().endswith('.sql') and str(f.get("severity", "")).upper() == "HIGH")
+    # Count critical/high issues by file type, tallied in one pass over those two buckets
+    extension_counts = Counter(
+        (level, os.path.splitext(f.get("filename", ""))[1].lower())
+        for level in ("Critical", "High") for f in buckets[level]
+    )
+    python_critical = extension_counts["Critical", ".py"]
+    python_high = extension_counts["High", ".py"]
+    sql_critical = extension_counts["Critical", ".sql"]
+    sql_high = extension_counts["High", ".sql"]
     
-    risk_emoji = {"LOW": "🟢", "MEDIUM": "🟡", "HIGH": "🟠", "CRITICAL": "🔴"}
-    quality_emoji = "🟢" if quality_score >= 80 else ("🟡" if quality_score >= 60 else "🔴")
+    # Resolve the report clock once; main() passes the run timestamp so every artifact agrees
+    analysis_date = (generated_at or datetime.now()).date().isoformat()  # same YYYY-MM-DD as strftime, without the format walk
+    
+    quality_emoji = score_band(quality_score)
     
     # FIXED: Executive Summary - No truncation, just ensure minimum 30 characters
     if len(summary) < 30:
         summary = summary + " Code review analysis completed."
     
-    display_text = f"""# 📊 Executive Code Review Report
-
-**Files Analyzed:** {len(processed_files)} files | **Analysis Date:** {datetime.now().strftime('%Y-%m-%d')} | **Database:** {current_database}.{current_schema}
-
-## 🎯 Executive Summary
-{summary}
-
-## 📈 Quality Dashboard
-
-| Metric | Score | Status | Business Impact |
-|--------|-------|--------|-----------------|
-| **Overall Quality** | {quality_score}/100 | {quality_emoji} | {business_impact} Risk |
-| **Security Risk** | {security_risk} | {risk_emoji.get(security_risk, "🟡")} | Critical security concerns |
-| **Technical Debt** | {tech_debt} | {risk_emoji.get(tech_debt, "🟡")} | {len(findings)} items |
-| **Maintainability** | {maintainability} | {risk_emoji.get(maintainability, "🟡")} | Long-term sustainability |
-
-## 🔍 Issue Distribution
-
-| Severity | Count | Priority Actions |
-|----------|-------|------------------|
-| 🔴 Critical | {critical_count} | Immediate fix required |
-| 🟠 High | {high_count} | Fix within sprint |
-| 🟡 Medium | {medium_count} | Plan for next release |
-| 🟢 Low | {low_count} | Technical improvement |
-
-## 📁 File Analysis Breakdown
-
-| File Type | Count | Critical Issues | High Issues |
-|-----------|-------|----------------|-------------|
-| 🐍 Python | {len(python_files)} | {python_critical} | {python_high} |
-| 🗄️ SQL | {len(sql_files)} | {sql_critical} | {sql_high} |
-
-"""
+    report_parts = [REPORT_TEMPLATE_HEADER.format(
+        file_count=len(processed_files),
+        analysis_date=analysis_date,
+        database=current_database,
+        schema=current_schema,
+        summary=summary,
+        quality_score=quality_score,
+        quality_emoji=quality_emoji,
+        business_impact=business_impact,
+        security_risk=security_risk,
+        security_emoji=RISK_EMOJI.get(security_risk, "🟡"),
+        tech_debt=tech_debt,
+        tech_debt_emoji=RISK_EMOJI.get(tech_debt, "🟡"),
+        findings_count=len(findings),
+        maintainability=maintainability,
+        maintainability_emoji=RISK_EMOJI.get(maintainability, "🟡"),
+        critical_count=critical_count,
+        high_count=high_count,
+        medium_count=medium_count,
+        low_count=low_count,
+        python_file_count=file_extension_counts[".py"],
+        python_critical=python_critical,
+        python_high=python_high,
+        sql_file_count=file_extension_counts[".sql"],
+        sql_critical=sql_critical,
+        sql_high=sql_high,
+    )]
 
     # ENHANCED: Previous issues resolution status WITH LINE NUMBERS AND FILENAMES
     if previous_issues:
-        display_text += """<details>
-<summary><strong>📈 Previous Issues Resolution Status</strong> (Click to expand)</summary>
-
-| Previous Issue | File | Line | Status | Details |
-|----------------|------|------|--------|---------|
-"""
+        report_parts.append(REPORT_SECTION_PREVIOUS_ISSUES)
         for issue in previous_issues:
             status = issue.get("status", "UNKNOWN")
-            status_emoji = {"RESOLVED": "✅", "PARTIALLY_RESOLVED": "⚠️", "NOT_ADDRESSED": "❌", "WORSENED": "🔴"}.get(status, "❓")
             
-            original_display = issue.get("original_issue", "")
+            original_display = escape_table_cell(str(issue.get("original_issue", "")))
             filename = issue.get("filename", "N/A")  # ENHANCED: Include filename
             line_number = issue.get("line_number", "N/A")
-            details_display = issue.get("details", "")
+            details_display = escape_table_cell(str(issue.get("details", "")))
             
-            display_text += f"| {original_display} | {filename} | {line_number} | {status_emoji} {status} | {details_display} |\n"
+            report_parts.append(f"| {original_display} | {filename} | {line_number} | {status_label(status)} | {details_display} |\n")
         
-        display_text += "\n</details>\n\n"
+        report_parts.append("\n</details>\n\n")
 
     # FILTER OUT LOW PRIORITY ISSUES from Current Review Findings
-    non_low_findings = [f for f in findings if str(f.get("severity", "")).upper() != "LOW"]
+    # Keep the buckets as-is rather than concatenating a filtered copy; only the top 20 are rendered
+    non_low_buckets = (buckets["Critical"], buckets["High"], buckets["Medium"], unranked_findings)
     
-    if non_low_findings:
-        display_text += """<details>
-<summary><strong>🔍 Current Review Findings</strong> (Click to expand)</summary>
-
-| Priority | File | Line | Issue | Business Impact |
-|----------|------|------|-------|-----------------|
-"""
+    if any(non_low_buckets):
+        report_parts.append(REPORT_SECTION_FINDINGS)
         
-        severity_order = {"Critical": 1, "High": 2, "Medium": 3, "Low": 4}
-        sorted_findings = sorted(non_low_findings, key=lambda x: severity_order.get(str(x.get("severity", "Low")), 4))
-        
-        for finding in sorted_findings[:20]:  # Show top 20 non-low findings
+        for finding in islice(chain.from_iterable(non_low_buckets), 20):  # Show top 20 non-low findings (buckets are already in severity order)
             severity = str(finding.get("severity", "Medium"))
-            filename = finding.get("filename", "N/A")
-            line = finding.get("line_number", "N/A")
-            
-            issue_display = str(finding.get("finding", ""))
-            business_impact_display = str(finding.get("business_impact", ""))
+            # Every cell holds model output, so all of them are escaped, not just the free text
+            filename = escape_table_cell(str(finding.get("filename", "N/A")))
+            line = escape_table_cell(str(finding.get("line_number", "N/A")))
             
-            priority_emoji = {"Critical": "🔴", "High": "🟠", "Medium": "🟡", "Low": "🟢"}.get(severity, "🟡")
+            issue_display = escape_table_cell(str(finding.get("finding", "")))
+            business_impact_display = escape_table_cell(str(finding.get("business_impact", "")))
             
-            display_text += f"| {priority_emoji} {severity} | {filename} | {line} | {issue_display} | {business_impact_display} |\n"
+            report_parts.append(f"| {severity_label(severity)} | {filename} | {line} | {issue_display} | {business_impact_display} |\n")
         
-        display_text += "\n</details>\n\n"
+        report_parts.append("\n</details>\n\n")
 
     if immediate_actions:
-        display_text += """<details>
-<summary><strong>⚡ Immediate Actions Required</strong> (Click to expand)</summary>
-
-"""
+        report_parts.append(REPORT_SECTION_ACTIONS)
         for i, action in enumerate(immediate_actions, 1):
-            display_text += f"{i}. {action}\n"
-        display_text += "\n</details>\n\n"
-
-    display_text += f"""---
+            report_parts.append(f"{i}. {action}\n")
+        report_parts.append("\n</details>\n\n")
 
-**📋 Review Summary:** {len(findings)} findings identified | **🎯 Quality Score:** {quality_score}/100 | **⚡ Critical Issues:** {critical_count}
+    report_parts.append(REPORT_TEMPLATE_FOOTER.format(
+        findings_count=len(findings),
+        quality_score=quality_score,
+        critical_count=critical_count,
+        database=current_database,
+        schema=current_schema,
+    ))
 
-*🔬 Powered by Snowflake Cortex AI • Two-Stage Executive Analysis • Stored in {current_database}.{current_schema}*"""
-
-    return display_text
+    return "".join(report_parts)
 
 def main():
     if len(sys.argv) >= 5:
@@ -940,34 +1298,50 @@ def main():
     print("\n🔍 STAGE 1: Individual File Analysis...")
     print("=" * 60)
     
+    # Read files in the background so each file's I/O overlaps the prompt building of the one before it
+    file_reader = ThreadPoolExecutor(max_workers=2)
+    pending_reads = {file_path: file_reader.submit(read_text_file, file_path) for file_path in code_files}
+
+    # Submit every file's Cortex reviews without waiting: the queries run concurrently while later
+    # files are read and prompted, and are collected in file order afterwards
+    pending_reviews = []
     for file_path in code_files:
         filename = os.path.basename(file_path)
         print(f"\n--- Reviewing file: {filename} ---")
         processed_files.append(filename)
 
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                code_content = f.read()
+            code_content = pending_reads.pop(file_path).result()
 
-            if not code_content.strip():
-                review_text = "No code found in file, skipping review."
+            if not code_content or code_content.isspace():  # no stripped copy of the file
+                chunk_jobs = [lambda: "No code found in file, skipping review."]
             else:
                 chunks = chunk_large_file(code_content)
                 print(f"  File split into {len(chunks)} chunk(s)")
                 
-                chunk_reviews = []
+                chunk_jobs = []
                 for i, chunk in enumerate(chunks):
                     chunk_name = f"{filename}_chunk_{i+1}" if len(chunks) > 1 else filename
                     print(f"  Processing chunk: {chunk_name}")
                     
                     individual_prompt = build_prompt_for_individual_review(chunk, chunk_name)
-                    review_text = review_with_cortex(MODEL, individual_prompt, session)
-                    chunk_reviews.append(review_text)
-                
-                if len(chunk_reviews) > 1:
-                    review_text = "\n\n".join([f"## Chunk {i+1}\n{review}" for i, review in enumerate(chunk_reviews)])
-                else:
-                    review_text = chunk_reviews[0]
+                    chunk_jobs.append(start_cortex_review(MODEL, individual_prompt))
+            pending_reviews.append((filename, chunk_jobs))
+        except Exception as e:
+            pending_reviews.append((filename, e))  # reported in order with the collected reviews
+
+    file_reader.shutdown()
+
+    for filename, chunk_jobs in pending_reviews:
+        try:
+            if isinstance(chunk_jobs, Exception):
+                raise chunk_jobs
+
+            chunk_reviews = [finish() for finish in chunk_jobs]
+            if len(chunk_reviews) > 1:
+                review_text = "\n\n".join([f"## Chunk {i+1}\n{review}" for i, review in enumerate(chunk_reviews)])
+            else:
+                review_text = chunk_reviews[0]
 
             all_individual_reviews.append({
                 "filename": filename,
@@ -976,8 +1350,7 @@ def main():
 
             output_filename = f"{Path(filename).stem}_individual_review.md"
             output_file_path = os.path.join(output_folder_path, output_filename)
-            with open(output_file_path, 'w', encoding='utf-8') as outfile:
-                outfile.write(review_text)
+            write_text_file(output_file_path, review_text)
             print(f"  ✅ Individual review saved: {output_filename}")
 
         except Exception as e:
@@ -996,6 +1369,10 @@ def main():
         return
 
     try:
+        # Review logging and previous-review lookups need Snowflake from here on;
+        # the first login also picks the logging database
+        session = get_session()
+
         # Setup the review log table with comparison_result field
         if database_available:
             setup_review_log_table()
@@ -1011,7 +1388,11 @@ def main():
         elif not database_available:
             print("  ⚠️ Database not available - cannot retrieve previous reviews")
 
-        combined_reviews_json = json.dumps(all_individual_reviews, indent=2)
+        # Trim the reviews against what the rest of the consolidation prompt leaves of the token budget
+        combined_reviews_json = fit_reviews_to_token_budget(
+            all_individual_reviews,
+            build_prompt_for_consolidated_summary("", previous_review_context, pull_request_number)
+        )
         print(f"  Combined reviews: {len(combined_reviews_json)} characters")
 
         # Generate consolidation prompt with or without previous context
@@ -1020,7 +1401,6 @@ def main():
             previous_review_context, 
             pull_request_number
         )
-        consolidation_prompt = consolidation_prompt.replace("{MAX_CHARS_FOR_FINAL_SUMMARY_FILE}", str(MAX_CHARS_FOR_FINAL_SUMMARY_FILE))
         consolidated_raw = review_with_cortex(MODEL, consolidation_prompt, session)
         
         try:
@@ -1033,9 +1413,12 @@ def main():
             
             # ENHANCED: Multiple JSON extraction strategies
             consolidated_json = None
+            # Every strategy needs an object, so locate its first brace once: without one there is
+            # nothing to extract, and the scans below skip whatever prose precedes it
+            json_start = consolidated_raw.find('{')
             
             # Strategy 1: Find JSON between ```json and ```
-            json_code_match = re.search(r'```json\s*(\{.*?\})\s*```', consolidated_raw, re.DOTALL)
+            json_code_match = JSON_CODE_BLOCK_RE.search(consolidated_raw) if json_start >= 0 else None
             if json_code_match:
                 try:
                     consolidated_json = json.loads(json_code_match.group(1))
@@ -1044,8 +1427,8 @@ def main():
                     pass
             
             # Strategy 2: Find largest JSON-like structure
-            if not consolidated_json:
-                json_matches = re.findall(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', consolidated_raw, re.DOTALL)
+            if not consolidated_json and json_start >= 0:
+                json_matches = JSON_CANDIDATE_RE.findall(consolidated_raw, json_start)
                 for match in sorted(json_matches, key=len, reverse=True):
                     try:
                         consolidated_json = json.loads(match)
@@ -1055,25 +1438,20 @@ def main():
                         continue
             
             # Strategy 3: Clean and fix common JSON issues
-            if not consolidated_json:
+            if not consolidated_json and json_start >= 0:
                 try:
-                    # Common fixes for malformed JSON
-                    cleaned_json = consolidated_raw
-                    # Fix trailing commas
-                    cleaned_json = re.sub(r',(\s*[}\]])', r'\1', cleaned_json)
-                    # Fix unquoted keys (basic cases)
-                    cleaned_json = re.sub(r'(\w+):', r'"\1":', cleaned_json)
-                    # Extract first complete JSON object
-                    json_match = re.search(r'\{.*\}', cleaned_json, re.DOTALL)
-                    if json_match:
-                        consolidated_json = json.loads(json_match.group())
-                        print("  ✅ Successfully parsed cleaned JSON")
+                    # Fix trailing commas and unquoted keys (basic cases) in a single pass; no repair
+                    # spans a brace, so the text from the first one repairs the same and opens the object
+                    cleaned_json = JSON_REPAIR_RE.sub(repair_json_match, consolidated_raw[json_start:])
+                    consolidated_json, _ = JSON_DECODER.raw_decode(cleaned_json)
+                    print("  ✅ Successfully parsed cleaned JSON")
                 except json.JSONDecodeError:
                     pass
             
             # Strategy 4: Fallback with basic structure
             if not consolidated_json:
                 print("  ❌ All JSON parsing strategies failed, using fallback")
+                discard_cortex_response(MODEL, consolidation_prompt)  # retried on the next run, not replayed
                 consolidated_json = {
                     "executive_summary": "JSON parsing failed - analysis completed with " + str(len(all_individual_reviews)) + " files reviewed",
                     "quality_score": 75,
@@ -1088,30 +1466,32 @@ def main():
                     "previous_issues_resolved": []
                 }
         
+        # Canonicalize severities once so scoring, display and extraction compare them directly
+        findings = normalize_finding_severities(consolidated_json.get("detailed_findings", []))
+        # One walk over the findings feeds the summary (and its regeneration) and the critical extraction
+        partitioned_findings = partition_findings_by_severity(findings)
+
         # ALWAYS calculate rule-based quality score
-        findings = consolidated_json.get("detailed_findings", [])
-        total_lines = sum(len(review.get("review_feedback", "").split('\n')) for review in all_individual_reviews)
+        total_lines = sum(review.get("review_feedback", "").count('\n') + 1 for review in all_individual_reviews)
         
-        rule_based_score = calculate_executive_quality_score(findings, total_lines)
+        rule_based_score = calculate_executive_quality_score(findings, total_lines, partitioned_findings)
         consolidated_json["quality_score"] = rule_based_score
         
         print(f"  🎯 Rule-based quality score calculated: {rule_based_score}/100 (overriding LLM score)")
 
-        executive_summary = format_executive_pr_display(consolidated_json, processed_files)
+        # Single clock read shared by the summary, its regeneration and review_output.json
+        generated_at = datetime.now()
+        executive_summary = format_executive_pr_display(consolidated_json, processed_files, generated_at, partitioned_findings)
         
         consolidated_path = os.path.join(output_folder_path, "consolidated_executive_summary.md")
-        with open(consolidated_path, 'w', encoding='utf-8') as f:
-            f.write(executive_summary)
-        print(f"  ✅ Executive summary saved: consolidated_executive_summary.md")
-
         json_path = os.path.join(output_folder_path, "consolidated_data.json")
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(consolidated_json, f, indent=2)
 
         # Generate review_output.json for inline_comment.py compatibility - MOVED AFTER comparison
-        critical_findings = [f for f in consolidated_json.get("detailed_findings", []) if str(f.get("severity", "")).upper() == "CRITICAL"]
+        critical_findings = partitioned_findings[0]["Critical"]
         
         criticals = []
+        # A proper critical issues summary for inline_comment.py with CUSTOM FORMAT, built in the same walk
+        summary_lines = ["Critical Issues Summary:\n"]
         for f in critical_findings:
             critical = {
                 "line": f.get("line_number", "N/A"),
@@ -1123,15 +1503,9 @@ def main():
                 "description": f.get("finding", "Critical issue found")
             }
             criticals.append(critical)
-
-        # Create a proper critical issues summary for inline_comment.py with CUSTOM FORMAT
-        critical_summary = ""
-        if critical_findings:
-            critical_summary = "Critical Issues Summary:\n"
-            for i, finding in enumerate(critical_findings, 1):
-                line_num = finding.get("line_number", "N/A")
-                # CUSTOM FORMAT: "Critical issues are also posted as inline comments on X line"
-                critical_summary += f"* **Line {line_num}:** Critical issues are also posted as inline comments on {line_num} line\n"
+            # CUSTOM FORMAT: "Critical issues are also posted as inline comments on X line"
+            summary_lines.append(f"* **Line {critical['line']}:** Critical issues are also posted as inline comments on {critical['line']} line\n")
+        critical_summary = "".join(summary_lines) if criticals else ""
 
         # IMPORTANT: Generate this BEFORE the LLM comparison stage so it's always available
         review_output_data = {
@@ -1142,11 +1516,16 @@ def main():
             "critical_summary": critical_summary,
             "critical_count": len(critical_findings),
             "file": processed_files[0] if processed_files else "unknown",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": generated_at.isoformat()
         }
 
-        with open("review_output.json", "w", encoding='utf-8') as f:
-            json.dump(review_output_data, f, indent=2, ensure_ascii=False)
+        # The three outputs are independent, so they are written together (and before Stage 3 may rewrite them)
+        write_outputs(
+            (write_text_file, consolidated_path, executive_summary),
+            (write_json_file, json_path, consolidated_json),
+            (write_json_file, "review_output.json", review_output_data),
+        )
+        print(f"  ✅ Executive summary saved: consolidated_executive_summary.md")
         print("  ✅ review_output.json saved for inline_comment.py compatibility")
 
         # ENHANCED: LLM-based comparison with previous review
@@ -1162,10 +1541,9 @@ def main():
                 print("📋 Previous review found. Performing LLM comparison...")
                 
                 # Format the comparison prompt using the template from second code
-                formatted_prompt = PROMPT_TO_COMPARE_REVIEWS.replace(
-                    "{previous_review_text}", str(previous_review_summary)
-                ).replace(
-                    "{new_review_text}", json.dumps(consolidated_json, indent=2)
+                formatted_prompt = COMPARE_REVIEWS_PROMPT.substitute(
+                    previous_review_text=previous_review_summary,
+                    new_review_text=json.dumps(consolidated_json, indent=2),
                 )
                 
                 # Use the LLM comparison function
@@ -1195,21 +1573,19 @@ def main():
                         print(f"📈 Updated consolidated JSON with {len(previous_issues_resolved)} previous issue statuses")
                         
                         # Regenerate executive summary with comparison data
-                        executive_summary = format_executive_pr_display(consolidated_json, processed_files)
-                        
-                        # Update the saved files
-                        with open(consolidated_path, 'w', encoding='utf-8') as f:
-                            f.write(executive_summary)
-                        with open(json_path, 'w', encoding='utf-8') as f:
-                            json.dump(consolidated_json, f, indent=2)
+                        executive_summary = format_executive_pr_display(consolidated_json, processed_files, generated_at, partitioned_findings)
                         
                         # IMPORTANT: Also update the review_output.json for inline_comment.py compatibility
                         review_output_data["full_review"] = executive_summary
                         review_output_data["full_review_markdown"] = executive_summary
                         review_output_data["full_review_json"] = consolidated_json
                         
-                        with open("review_output.json", "w", encoding='utf-8') as f:
-                            json.dump(review_output_data, f, indent=2, ensure_ascii=False)
+                        # Update the saved files
+                        write_outputs(
+                            (write_text_file, consolidated_path, executive_summary),
+                            (write_json_file, json_path, consolidated_json),
+                            (write_json_file, "review_output.json", review_output_data),
+                        )
                         
                         print("✅ Updated executive summary, JSON files, and review_output.json with comparison results")
                 else:
@@ -1225,7 +1601,8 @@ def main():
             delimiter = str(uuid.uuid4())
             with open(os.environ['GITHUB_OUTPUT'], 'a') as gh_out:
                 gh_out.write(f'consolidated_summary_text<<{delimiter}\n')
-                gh_out.write(f'{executive_summary}\n')
+                gh_out.write(executive_summary)  # written as-is rather than copied into a new string with the newline
+                gh_out.write('\n')
                 gh_out.write(f'{delimiter}\n')
             print("  ✅ GitHub Actions output written")
 
@@ -1240,7 +1617,7 @@ def main():
         else:
             print(f"🔄 LLM comparison: ❌ (No previous review or comparison failed)")
         print(f"🎯 Quality Score: {consolidated_json.get('quality_score', 'N/A')}/100")
-        print(f"📈 Findings: {len(consolidated_json.get('detailed_findings', []))}")
+        print(f"📈 Findings: {len(findings)}")
         
         if database_available:
             print(f"💾 Database logging: ✅ APPENDED to {current_database}.{current_schema} with comparison_result")
@@ -1256,6 +1633,6 @@ if __name__ == "__main__":
     try:
         main()
     finally:
-        if 'session' in locals():
+        if session is not None:
             session.close()
             print("\n🔒 Session closed")
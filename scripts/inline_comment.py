@@ -71,7 +71,8 @@ if __name__ == "__main__":
         print(f"Found {len(review_data['criticals'])} critical issues")
         
         # Post overall PR review comment
-        review_body = f"""## Automated LLM Code Review
+        # Collect the parts and join once: the body embeds the full review, which every += would recopy
+        review_parts = [f"""## Automated LLM Code Review
 
 **File Reviewed:** {review_data['file']}
 **Critical Issues Found:** {len(review_data['criticals'])}
@@ -80,15 +81,16 @@ if __name__ == "__main__":
 {review_data['full_review']}
 
 ### Critical Issues Summary:
-"""
+"""]
         
         for critical in review_data['criticals']:
             # FIX: Use 'finding' instead of 'issue' since that's what cortex_python_review.py creates
             finding_text = critical.get('finding', 'No description available')
             line_num = critical.get('line', critical.get('line_number', 'N/A'))
-            review_body += f"- **Line {line_num}:** {finding_text}\n"
+            review_parts.append(f"- **Line {line_num}:** {finding_text}\n")
         
-        review_body += "\n*Critical issues are also posted as inline comments on specific lines.*"
+        review_parts.append("\n*Critical issues are also posted as inline comments on specific lines.*")
+        review_body = "".join(review_parts)
         
         post_pr_comment(review_body)
         
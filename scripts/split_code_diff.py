@@ -1,12 +1,11 @@
 import subprocess
-import tiktoken
-from whatthepatch import parse_patch
-import re
 import os,sys
 
 # --- Configuration ---
 # The target context window size for the LLM.
 CONTEXT_WINDOW_TOKENS = 100000 
+# Section-header keywords that open a new function/class block.
+LOGICAL_BLOCK_KEYWORDS = ("class", "def")
 
 def count_tokens(text: str, tokenizer) -> int:
     """Calculates the number of tokens in a given text."""
@@ -25,15 +24,12 @@ def get_git_diff(base_branch: str) -> str:
 
 def format_patch_from_hunks(patch, hunks) -> str:
     """Reconstructs a diff string from a patch header and a list of hunks."""
-    header = f"diff --git a/{patch.header.old_path} b/{patch.header.new_path}\n"
-    header += f"--- a/{patch.header.old_path}\n"
-    header += f"+++ b/{patch.header.new_path}\n"
-    
-    hunk_texts = []
-    for hunk in hunks:
-        hunk_texts.append(str(hunk))
-        
-    return header + "\n".join(hunk_texts)
+    old_path, new_path = patch.header.old_path, patch.header.new_path
+    # Header and hunks go into a single join rather than growing the string piece by piece
+    return "".join((
+        f"diff --git a/{old_path} b/{new_path}\n--- a/{old_path}\n+++ b/{new_path}\n",
+        "\n".join(map(str, hunks)),
+    ))
 
 def split_file_diff(patch, tokenizer) -> list[str]:
     """
@@ -54,7 +50,9 @@ def split_file_diff(patch, tokenizer) -> list[str]:
 
         # Check for function/class definition in the hunk header (the '@@' line)
         # This signals a good logical point to split the diff.
-        is_new_logical_block = hunk.section_header and re.match(r'^(class|def)\s+', hunk.section_header.strip())
+        # Plain whitespace split: a keyword followed by a name, no regex engine per hunk.
+        header_words = (hunk.section_header or "").split(None, 1)
+        is_new_logical_block = len(header_words) == 2 and header_words[0] in LOGICAL_BLOCK_KEYWORDS
 
         # If we find a new block and the current chunk is not empty,
         # we finalize the previous chunk.
@@ -95,14 +93,19 @@ def create_diff_chunks(code_to_review, OUTPUT_CHUNKS_DIR) -> list[str]:
     Main function to generate git diff and split it into chunks
     that fit within the LLM's context window.
     """
-    print("Initializing tokenizer...")
-    tokenizer = tiktoken.get_encoding("cl100k_base")
     full_diff = code_to_review
 
     if not full_diff or not full_diff.strip():
         print("No diff found or git error occurred.")
         return []
 
+    # Deferred until there is a diff to split: both are slow to import and unused otherwise
+    import tiktoken
+    from whatthepatch import parse_patch
+
+    print("Initializing tokenizer...")
+    tokenizer = tiktoken.get_encoding("cl100k_base")
+
     print(f"Diff content preview (first 500 chars):\n{full_diff[:500]}")
     print("="*50)
 